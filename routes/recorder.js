@@ -3,6 +3,7 @@ const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs-extra');
 const http = require('http');
+const readline = require('readline');
 
 const router = express.Router();
 
@@ -183,30 +184,17 @@ router.delete('/monitor/:username', (req, res) => {
     autoUploadTimers.delete(username);
   }
   
-  // Stop any active recording gracefully
+  // Stop any active recording gracefully, allowing post-processing
   if (activeRecordings.has(username)) {
     const recording = activeRecordings.get(username);
-    if (recording.process && !recording.process.killed) {
-      // Send SIGTERM for graceful shutdown, allowing post-processing
-      recording.process.kill('SIGTERM');
-      
-      // Mark as stopping
+    if (recording.status === 'recording') {
+      // removed once the recording_finished event arrives
       recording.status = 'stopping';
-      
-      // Notify that recording is finishing
-      if (recording.filename) {
-        notifyFileStatus(recording.filename, false);
-      }
-      
-      // Wait a bit for graceful shutdown, then force kill if needed
-      setTimeout(() => {
-        if (recording.process && !recording.process.killed) {
-          console.log(`[${username}] Force killing process after graceful shutdown timeout`);
-          recording.process.kill('SIGKILL');
-        }
-      }, 30000); // 30 seconds for post-processing
+    } else {
+      activeRecordings.delete(username);
     }
   }
+  stopMonitoring(username);
 
   // Remove from monitoring
   if (monitoredUsers.has(username)) {
@@ -292,26 +280,194 @@ router.delete('/cancel-auto-upload/:username', (req, res) => {
   }
 });
 
-// Start monitoring function
-function startMonitoring(username, interval) {
+// Update the state of a recording from an event of the Python recorder
+function handleRecorderEvent(username, event) {
+  const recording = activeRecordings.get(username);
+  // the last recording of a removed user is still converted and uploaded
+  if (!recording && event.event !== 'conversion_finished') return;
+
+  switch (event.event) {
+    case 'recording_started':
+      console.log(`🎬 Recording started for @${username}`);
+      recording.status = 'recording';
+      recording.bytes = 0;
+      recording.bitrate = 0;
+
+      // Cancel any existing auto-upload timer since new recording started
+      if (autoUploadTimers.has(username)) {
+        clearTimeout(autoUploadTimers.get(username));
+        autoUploadTimers.delete(username);
+      }
+
+      if (!event.segmented) {
+        recording.filename = path.basename(event.file);
+        console.log(`📁 Recording filename: ${recording.filename}`);
+
+        // Notify files API that recording started
+        notifyFileStatus(recording.filename, true);
+      }
+      break;
+
+    case 'recording_progress':
+      recording.bytes = event.bytes;
+      recording.bitrate = event.bitrate;
+      break;
+
+    case 'reconnected':
+      recording.reconnects = event.reconnects;
+      break;
+
+    case 'recording_finished':
+      console.log(`🏁 Recording finished for @${username}`);
+      recording.recordingEndTime = new Date();
+
+      if (recording.filename) {
+        // Notify files API that recording finished
+        notifyFileStatus(recording.filename, false);
+      }
+
+      recording.status = 'monitoring';
+      recording.filename = null;
+
+      if (!monitoredUsers.has(username)) {
+        activeRecordings.delete(username);
+      }
+      break;
+
+    case 'conversion_finished':
+      console.log(`✅ Conversion process completed for @${username}`);
+
+      // Start auto-upload immediately instead of waiting 5 minutes
+      setTimeout(() => {
+        console.log(`⏰ Auto-upload starting now for @${username}`);
+        startAutoUpload(username);
+      }, 10000); // Wait just 10 seconds to ensure file is fully written
+      break;
+
+    case 'conversion_failed':
+    case 'upload_failed':
+      console.error(`[${username}] ${event.event}: ${event.file}`);
+      break;
+
+    case 'upload_progress':
+      recording.uploadProgress = Math.round(event.bytes * 100 / event.total);
+      break;
+  }
+}
+
+// The Python recorder runs as one daemon watching every monitored user;
+// users are added and removed through its local control API
+const CONTROL_PORT = parseInt(process.env.RECORDER_CONTROL_PORT || '8765', 10);
+let recorderDaemon = null; // { process, ready }
+
+// Call the control API of the recorder daemon
+function controlRequest(method, apiPath, body) {
+  return new Promise((resolve, reject) => {
+    const postData = body ? JSON.stringify(body) : '';
+
+    const req = http.request({
+      hostname: '127.0.0.1',
+      port: CONTROL_PORT,
+      path: apiPath,
+      method: method,
+      headers: {
+        'Content-Type': 'application/json',
+        'Content-Length': Buffer.byteLength(postData)
+      },
+      timeout: 10000,
+      family: 4
+    }, (res) => {
+      let data = '';
+      res.on('data', (chunk) => {
+        data += chunk;
+      });
+
+      res.on('end', () => {
+        try {
+          resolve({ status: res.statusCode, data: JSON.parse(data) });
+        } catch (parseError) {
+          resolve({ status: res.statusCode, data: {} });
+        }
+      });
+    });
+
+    req.on('error', reject);
+    req.on('timeout', () => {
+      req.destroy(new Error('Control API request timed out'));
+    });
+
+    req.write(postData);
+    req.end();
+  });
+}
+
+// Resolve once the control API of a starting daemon answers
+async function waitForControlApi(daemon, timeout = 60000) {
+  const deadline = Date.now() + timeout;
+
+  while (Date.now() < deadline) {
+    if (daemon.process.exitCode !== null) {
+      throw new Error('Recorder daemon exited during startup');
+    }
+    try {
+      const { status, data } = await controlRequest('GET', '/users');
+      if (status === 200 && Array.isArray(data.users)) return;
+    } catch (error) {
+      // not listening yet
+    }
+    await new Promise(resolve => setTimeout(resolve, 500));
+  }
+  throw new Error('Recorder daemon did not start in time');
+}
+
+// The user an event is about, taken from the file name for post-processing
+function eventUser(event) {
+  if (event.user) return event.user;
+
+  const match = path.basename(event.file || '').match(/^TK_(.+)_\d{4}\.\d{2}\.\d{2}_/);
+  return match ? match[1] : null;
+}
+
+// Keep the daemon log lines that mention a user in that user's logs
+function addUserLogs(log, type) {
+  activeRecordings.forEach((recording, username) => {
+    if (!log.includes(`@${username}`) && !log.includes(`USERNAME: ${username}`) &&
+        !log.includes(`TK_${username}_`)) {
+      return;
+    }
+
+    recording.logs.push({ type, message: log, timestamp: new Date() });
+
+    // Keep only last 50 logs
+    if (recording.logs.length > 50) {
+      recording.logs = recording.logs.slice(-50);
+    }
+  });
+}
+
+// Start the recorder daemon if it is not running, resolves once it accepts users
+function ensureRecorderDaemon() {
+  if (recorderDaemon) return recorderDaemon.ready;
+
   const pythonScriptPath = path.join(__dirname, '../src/main.py');
   const recordingsDir = path.join(__dirname, '../recordings');
-  
+
   // Ensure recordings directory exists
   fs.ensureDirSync(recordingsDir);
-  
+
   const args = [
     '-u', // IMPORTANT: Unbuffered Python output
     pythonScriptPath,
-    '-user', username,
     '-mode', 'automatic',
-    '-automatic_interval', interval.toString(),
+    '-control_port', CONTROL_PORT.toString(),
     '-output', recordingsDir + '/',
     '-no-update-check',
-    '--no-banner'
+    '--no-banner',
+    // recorder state comes as JSON lines on fd 3, logs stay on stdout
+    '-events_fd', '3'
   ];
 
-  console.log(`🎯 Starting monitoring for @${username} with ${interval} min interval`);
+  console.log(`🎯 Starting recorder daemon on control port ${CONTROL_PORT}`);
 
   // Set up environment to ensure Python output is unbuffered
   const env = Object.assign({}, process.env, {
@@ -321,26 +477,23 @@ function startMonitoring(username, interval) {
 
   const pythonProcess = spawn('python3', args, {
     cwd: path.join(__dirname, '../src'),
-    stdio: ['pipe', 'pipe', 'pipe'],
+    stdio: ['pipe', 'pipe', 'pipe', 'pipe'],
     env: env
   });
 
-  // Store the process
-  activeRecordings.set(username, {
-    process: pythonProcess,
-    startTime: new Date(),
-    status: 'monitoring',
-    logs: [],
-    filename: null,
-    recordingEndTime: null,
-    lastHeartbeat: new Date()
+  const daemon = { process: pythonProcess };
+  recorderDaemon = daemon;
+  daemon.ready = waitForControlApi(daemon);
+  daemon.ready.catch((error) => {
+    console.error(`[recorder] ${error.message}`);
   });
 
-  // Set up a heartbeat to track if process is still alive
+  // Set up a heartbeat to track if the daemon is still alive
   const heartbeatInterval = setInterval(() => {
-    const recording = activeRecordings.get(username);
-    if (recording && recording.process && !recording.process.killed) {
-      recording.lastHeartbeat = new Date();
+    if (!pythonProcess.killed && pythonProcess.exitCode === null) {
+      activeRecordings.forEach((recording) => {
+        recording.lastHeartbeat = new Date();
+      });
     } else {
       clearInterval(heartbeatInterval);
     }
@@ -349,190 +502,143 @@ function startMonitoring(username, interval) {
   // Handle process output with immediate logging
   pythonProcess.stdout.on('data', (data) => {
     const lines = data.toString().split('\n').filter(line => line.trim());
-    
+
     lines.forEach(log => {
-      if (!log.trim()) return;
-      
       // Immediately log to console for Render visibility
-      console.log(`[${username}] ${log}`);
-      
-      const recording = activeRecordings.get(username);
-      if (recording) {
-        recording.logs.push({ type: 'info', message: log, timestamp: new Date() });
-        
-        // Check if recording started
-        if (log.includes('Started recording')) {
-          console.log(`🎬 Recording started for @${username}`);
-          recording.status = 'recording';
-          
-          // Cancel any existing auto-upload timer since new recording started
-          if (autoUploadTimers.has(username)) {
-            clearTimeout(autoUploadTimers.get(username));
-            autoUploadTimers.delete(username);
-          }
-          
-          // Extract filename from log - look for the FLV filename pattern
-          const filenameMatch = log.match(/TK_[^_]+_[^_]+_[^.]+_flv\.mp4/);
-          
-          if (filenameMatch) {
-            recording.filename = filenameMatch[0];
-            console.log(`📁 Recording filename: ${recording.filename}`);
-            
-            // Notify files API that recording started
-            notifyFileStatus(recording.filename, true);
-          } else {
-            // If we can't find the filename in the log, generate expected filename
-            const timestamp = new Date().toISOString()
-              .replace(/[-:]/g, '')
-              .replace(/\..+/, '')
-              .replace('T', '_')
-              .slice(0, 15);
-            const expectedFilename = `TK_${username}_${timestamp}_flv.mp4`;
-            recording.filename = expectedFilename;
-            
-            // Notify files API that recording started
-            notifyFileStatus(recording.filename, true);
-          }
-        }
-        
-        // Check if recording finished
-        if (log.includes('Recording finished')) {
-          console.log(`🏁 Recording finished for @${username}`);
-          recording.recordingEndTime = new Date();
-          
-          if (recording.filename) {
-            // Notify files API that recording finished
-            notifyFileStatus(recording.filename, false);
-          }
-          
-          recording.status = 'monitoring';
-          recording.filename = null;
-        }
-        
-        // Check for conversion completion
-        if (log.includes('Finished converting') || log.includes('already in MP4 format') || log.includes('skipping conversion')) {
-          console.log(`✅ Conversion process completed for @${username}`);
-          
-          // Start auto-upload immediately instead of waiting 5 minutes
-          setTimeout(() => {
-            console.log(`⏰ Auto-upload starting now for @${username}`);
-            startAutoUpload(username);
-          }, 10000); // Wait just 10 seconds to ensure file is fully written
-        }
-        
-        // Check for user not live message
-        if (log.includes('is not hosting a live stream') || log.includes('USER_NOT_CURRENTLY_LIVE')) {
-          console.log(`⏳ @${username} is not live, will check again in ${interval} minutes`);
-        }
-        
-        // Check for room ID retrieval
-        if (log.includes('ROOM_ID:')) {
-          console.log(`🔑 Room ID retrieved for @${username}`);
-        }
-        
-        // Keep only last 50 logs
-        if (recording.logs.length > 50) {
-          recording.logs = recording.logs.slice(-50);
-        }
-      }
+      console.log(`[recorder] ${log}`);
+      addUserLogs(log, 'info');
     });
   });
 
   pythonProcess.stderr.on('data', (data) => {
     const lines = data.toString().split('\n').filter(line => line.trim());
-    
+
     lines.forEach(log => {
-      if (!log.trim()) return;
-      
       // Always log stderr to console for visibility
       const isError = log.includes('[!]') || log.includes('ERROR') || log.includes('error:');
-      
+
       if (isError) {
-        console.error(`[${username}] ERROR: ${log}`);
+        console.error(`[recorder] ERROR: ${log}`);
       } else {
-        console.log(`[${username}] ${log}`);
-      }
-      
-      const recording = activeRecordings.get(username);
-      if (recording) {
-        const logType = isError ? 'error' : 'info';
-        recording.logs.push({ type: logType, message: log, timestamp: new Date() });
-        
-        // Check for conversion completion in stderr as well
-        if (log.includes('Finished converting') || log.includes('already in MP4 format') || log.includes('skipping conversion')) {
-          console.log(`✅ Conversion process completed for @${username}`);
-          
-          // Start auto-upload immediately instead of waiting 5 minutes
-          setTimeout(() => {
-            console.log(`⏰ Auto-upload starting now for @${username}`);
-            startAutoUpload(username);
-          }, 10000); // Wait just 10 seconds to ensure file is fully written
-        }
+        console.log(`[recorder] ${log}`);
       }
+      addUserLogs(log, isError ? 'error' : 'info');
     });
   });
 
-  pythonProcess.on('close', (code) => {
-    console.log(`[${username}] Process exited with code ${code}`);
+  // Structured recorder events, one JSON object per line
+  readline.createInterface({ input: pythonProcess.stdio[3] }).on('line', (line) => {
+    let event;
+    try {
+      event = JSON.parse(line);
+    } catch (error) {
+      console.error(`[recorder] Invalid recorder event: ${line}`);
+      return;
+    }
+
+    if (event.v !== 1) return;
+
+    const username = eventUser(event);
+    if (username) {
+      handleRecorderEvent(username, event);
+    }
+  });
+
+  // Restart the daemon with every monitored user after it ends
+  const restart = (delay) => {
     clearInterval(heartbeatInterval);
-    
-    const recording = activeRecordings.get(username);
-    if (recording) {
+    if (recorderDaemon !== daemon) return;
+    recorderDaemon = null;
+
+    activeRecordings.forEach((recording, username) => {
       // Notify that any active recording is finished
       if (recording.filename) {
         notifyFileStatus(recording.filename, false);
       }
-      
+      recording.filename = null;
       recording.status = 'stopped';
-      recording.exitCode = code;
-    }
-    
-    // If user is still monitored and process wasn't manually stopped, restart
-    if (monitoredUsers.has(username)) {
-      if (code !== 0) {
-        console.log(`[${username}] Process crashed, restarting in 30 seconds...`);
-      } else {
-        console.log(`[${username}] Process ended normally, restarting monitoring...`);
+
+      if (!monitoredUsers.has(username)) {
+        activeRecordings.delete(username);
       }
-      
-      setTimeout(() => {
-        if (monitoredUsers.has(username)) {
-          console.log(`[${username}] Restarting monitoring process...`);
-          activeRecordings.delete(username);
-          startMonitoring(username, monitoredUsers.get(username).interval);
-        }
-      }, 30000);
-    } else {
-      // Clean up if user was removed
-      activeRecordings.delete(username);
-    }
+    });
+
+    if (monitoredUsers.size === 0) return;
+
+    console.log(`[recorder] Restarting in ${delay / 1000} seconds...`);
+    setTimeout(() => {
+      monitoredUsers.forEach((info, username) => {
+        startMonitoring(username, info.interval);
+      });
+    }, delay);
+  };
+
+  pythonProcess.on('close', (code) => {
+    console.log(`[recorder] Daemon exited with code ${code}`);
+    restart(30000);
   });
 
   pythonProcess.on('error', (error) => {
-    console.error(`[${username}] Process error:`, error);
-    clearInterval(heartbeatInterval);
-    
-    const recording = activeRecordings.get(username);
-    if (recording) {
-      // Notify that recording failed
-      if (recording.filename) {
-        notifyFileStatus(recording.filename, false);
-      }
-      
+    console.error('[recorder] Daemon error:', error);
+    activeRecordings.forEach((recording) => {
       recording.error = error.message;
       recording.status = 'error';
-    }
-    
-    // Try to restart if user is still monitored
-    if (monitoredUsers.has(username)) {
-      console.log(`[${username}] Will retry monitoring in 60 seconds...`);
-      setTimeout(() => {
-        if (monitoredUsers.has(username)) {
-          activeRecordings.delete(username);
-          startMonitoring(username, monitoredUsers.get(username).interval);
-        }
-      }, 60000);
-    }
+    });
+    restart(60000);
+  });
+
+  return daemon.ready;
+}
+
+// Start monitoring function
+function startMonitoring(username, interval) {
+  console.log(`🎯 Starting monitoring for @${username} with ${interval} min interval`);
+
+  activeRecordings.set(username, {
+    startTime: new Date(),
+    status: 'monitoring',
+    logs: [],
+    filename: null,
+    recordingEndTime: null,
+    lastHeartbeat: new Date()
+  });
+
+  ensureRecorderDaemon()
+    .then(() => controlRequest('POST', '/users', { user: username, interval: interval }))
+    .then(({ status, data }) => {
+      // 409: already watched, e.g. when the web layer restarted
+      if (status !== 201 && status !== 409) {
+        throw new Error(data.error || `Control API returned ${status}`);
+      }
+    })
+    .catch((error) => {
+      console.error(`[${username}] Could not start monitoring: ${error.message}`);
+      const recording = activeRecordings.get(username);
+      if (recording) {
+        recording.error = error.message;
+        recording.status = 'error';
+      }
+    });
+}
+
+// Stop watching a user, a recording in progress is finished and post-processed
+function stopMonitoring(username) {
+  if (!recorderDaemon) return Promise.resolve();
+
+  return controlRequest('DELETE', `/users/${encodeURIComponent(username)}`)
+    .catch((error) => {
+      console.error(`[${username}] Could not stop monitoring: ${error.message}`);
+    });
+}
+
+// Stop the recorder daemon, ending every recording
+function stopRecorderDaemon() {
+  const daemon = recorderDaemon;
+  if (!daemon) return Promise.resolve();
+
+  recorderDaemon = null;
+  return controlRequest('POST', '/stop').catch(() => {
+    daemon.process.kill('SIGTERM');
   });
 }
 
@@ -626,7 +732,7 @@ router.get('/health/processes', (req, res) => {
     processHealth.push({
       username,
       status: recording.status,
-      isAlive: recording.process && !recording.process.killed,
+      isAlive: !!recorderDaemon && recorderDaemon.process.exitCode === null,
       lastHeartbeat: recording.lastHeartbeat,
       secondsSinceHeartbeat: timeSinceHeartbeat,
       isHealthy: timeSinceHeartbeat && timeSinceHeartbeat < 120 // Healthy if heartbeat within 2 minutes
@@ -640,4 +746,6 @@ router.get('/health/processes', (req, res) => {
   });
 });
 
+router.stopRecorderDaemon = stopRecorderDaemon;
+
 module.exports = router;
\ No newline at end of file
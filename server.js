@@ -124,14 +124,10 @@ async function gracefulShutdown(signal) {
     console.log('HTTP server closed');
   });
   
-  // Clean up any Python processes
+  // Stop the recorder daemon, it closes the recordings in progress
   try {
-    const { spawn } = require('child_process');
-    
-    // Kill all Python processes started by this app
-    const killProcess = spawn('pkill', ['-f', 'main.py']);
-    killProcess.on('close', (code) => {
-      console.log(`Python processes terminated with code ${code}`);
+    require('./routes/recorder').stopRecorderDaemon().then(() => {
+      console.log('Recorder daemon stopped');
     });
     
     // Give processes time to clean up
@@ -0,0 +1,172 @@
+"""
+Offline benchmarks of the recorder against the local fake TikTok server:
+stream write throughput, followers sweep latency, conversion time and
+memory per recording.
+
+Usage: python benchmarks/bench_recorder.py [users] [recordings]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_tiktok import FakeTikTok  # noqa: E402
+from core.room_info import RoomInfoCache  # noqa: E402
+from core.tiktok_api import TikTokAPI  # noqa: E402
+from core.tiktok_recorder import TikTokRecorder, SWEEP_LOOKUPS, \
+    SWEEP_CHECKS  # noqa: E402
+from utils.enums import Mode  # noqa: E402
+from utils.stream_writer import StreamWriter, ThreadedStreamWriter  # noqa: E402
+from utils.video_management import VideoManagement  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def use_server(fake):
+    TikTokAPI.configure(base_url=fake.url, webcast_url=fake.url)
+    api = TikTokAPI(proxy=None, cookies=None)
+    # keep the fake users out of the room id cache of the recorder
+    api.room_cache = None
+    # snapshots of an earlier server point at streams on a closed port
+    api.room_info_cache = RoomInfoCache()
+    return api
+
+
+def record(api, room_id, path, writer_class=ThreadedStreamWriter):
+    """
+    Copies the stream of a room to a file the way start_recording does.
+    """
+    response = api.open_live_stream(api.get_live_url(room_id))
+    with open(path, "wb", buffering=0) as out_file:
+        writer = writer_class(out_file.fileno())
+        try:
+            while writer.read_from(response.raw):
+                pass
+        finally:
+            writer.close()
+            response.close()
+    return writer.bytes_written
+
+
+def bench_stream_write(directory):
+    with FakeTikTok(users=1, live_every=1, bitrate=50000, duration=60,
+                    realtime=False) as fake:
+        api = use_server(fake)
+        room_id = api.get_room_id_from_user('user0')
+
+        for writer_class in (StreamWriter, ThreadedStreamWriter):
+            path = os.path.join(directory, f"{writer_class.__name__}.flv")
+            start = time.perf_counter()
+            size = record(api, room_id, path, writer_class)
+            elapsed = time.perf_counter() - start
+            print(f"{writer_class.__name__:<28} "
+                  f"{size / MB / elapsed:9.1f} MB/s ({size / MB:.0f} MB)")
+            os.remove(path)
+
+
+def bench_followers_sweep(users):
+    with FakeTikTok(users=users, latency=20) as fake:
+        api = use_server(fake)
+        sec_uid = api.get_sec_uid()
+
+        start = time.perf_counter()
+        followers = api.get_followers_list(sec_uid)
+        listed = time.perf_counter()
+
+        room_ids = {}
+        for follower in followers:
+            room_ids[follower] = api.get_room_id_from_user(follower)
+        resolved = time.perf_counter()
+
+        alive = api.are_rooms_alive(room_ids.values())
+        checked = time.perf_counter()
+
+        print(f"followers list ({len(followers)})".ljust(28) +
+              f" {(listed - start) * 1000:9.1f} ms")
+        print(f"{'room ids':<28} {(resolved - listed) * 1000:9.1f} ms")
+        print(f"{'liveness':<28} {(checked - resolved) * 1000:9.1f} ms")
+        sequential = checked - listed
+        print(f"{'sequential sweep':<28} {sequential * 1000:9.1f} ms "
+              f"({sum(alive.values())} live)")
+
+        # the sweep of followers mode, live followers are not recorded
+        recorder = TikTokRecorder(
+            url=None, user=None, room_id=None, mode=Mode.FOLLOWERS,
+            automatic_interval=1, cookies=None, proxy=None, output=None,
+            duration=None, use_telegram=False, tiktok=api)
+        recorder._record_follower = lambda follower, room_id: None
+
+        active_recordings = {}
+        with ThreadPoolExecutor(SWEEP_LOOKUPS) as lookups, \
+                ThreadPoolExecutor(SWEEP_CHECKS) as checks:
+            start = time.perf_counter()
+            recorder._sweep_followers(
+                followers, active_recordings, lookups, checks)
+            pipelined = time.perf_counter() - start
+
+        print(f"{'pipelined sweep':<28} {pipelined * 1000:9.1f} ms "
+              f"({len(active_recordings)} live, "
+              f"x{sequential / pipelined:.1f})")
+
+
+def bench_conversion(directory):
+    if shutil.which('ffmpeg') is None:
+        print(f"{'conversion':<28} skipped, ffmpeg not found")
+        return
+
+    with FakeTikTok(users=1, live_every=1, bitrate=4000, duration=120,
+                    realtime=False) as fake:
+        api = use_server(fake)
+        path = os.path.join(directory, "TK_user0_bench_flv.mp4")
+        size = record(api, api.get_room_id_from_user('user0'), path)
+
+    start = time.perf_counter()
+    VideoManagement.convert_flv_to_mp4(path)
+    elapsed = time.perf_counter() - start
+    print(f"{'conversion':<28} {elapsed * 1000:9.1f} ms ({size / MB:.0f} MB)")
+
+
+def bench_memory(directory, recordings):
+    with FakeTikTok(users=recordings, live_every=1, bitrate=2000,
+                    duration=5) as fake:
+        api = use_server(fake)
+        room_ids = [api.get_room_id_from_user(user) for user in fake.users]
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        threads = [
+            threading.Thread(target=record, args=(
+                api, room_id, os.path.join(directory, f"{room_id}.flv")))
+            for room_id in room_ids
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+
+    print(f"memory ({recordings} recordings)".ljust(28) +
+          f" {peak / recordings / MB:9.2f} MB per recording")
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    recordings = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_stream_write(directory)
+        bench_followers_sweep(users)
+        bench_conversion(directory)
+        bench_memory(directory, recordings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Cold start time of the recorder, the cost paid by every main.py the web
+interface launches. Each step runs in a fresh interpreter and the median
+of several runs is kept.
+
+Usage: python benchmarks/bench_startup.py [runs] [target_ms]
+
+Exits with status 1 when a launch takes longer than the target.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# milliseconds a launch may take before the benchmark fails
+STARTUP_TARGET = 500
+
+STEPS = {
+    'interpreter': ['-c', 'pass'],
+    'dependency check': [
+        '-c', 'from utils.dependencies import check_and_install_dependencies; '
+              'check_and_install_dependencies()'
+    ],
+    'recorder imports': [
+        '-c', 'import core.tiktok_recorder, core.supervisor, core.post_processor'
+    ],
+    'main.py -h': ['main.py', '--no-banner', '-h'],
+}
+
+
+def run(args):
+    """
+    Returns the milliseconds the command took and whether it succeeded.
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, *args],
+        cwd=SRC_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return (time.perf_counter() - start) * 1000, process.returncode == 0
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    target = int(sys.argv[2]) if len(sys.argv) > 2 else STARTUP_TARGET
+
+    # the first launch fills the dependency cache, later ones reuse it
+    _, cached = run(STEPS['dependency check'])
+    if not cached:
+        print("dependency check failed, timings include the full check")
+
+    results = {}
+    for name, args in STEPS.items():
+        results[name] = statistics.median(
+            run(args)[0] for _ in range(runs))
+        print(f"{name:<28} {results[name]:9.1f} ms")
+
+    launch = results['main.py -h']
+    print(f"{'target':<28} {target:9.1f} ms")
+    if launch > target:
+        print(f"main.py launch is {launch - target:.0f} ms over the target")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
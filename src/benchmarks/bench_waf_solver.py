@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the WAF proof-of-work solver.
+
+Usage: python benchmarks/bench_waf_solver.py [nonce]
+"""
+import base64
+import json
+import os
+import sys
+import time
+from hashlib import sha256
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.tiktok_waf_solver import WAFSolver  # noqa: E402
+
+
+def make_challenge(nonce):
+    prefix = os.urandom(16)
+    digest = sha256(prefix + str(nonce).encode('utf-8')).digest()
+    cs = base64.b64encode(json.dumps({
+        'v': {
+            'a': base64.b64encode(prefix).decode(),
+            'c': base64.b64encode(digest).decode(),
+        }
+    }).encode()).decode()
+    html = f'<p id="wci" class="wci_cookie"></p><p id="cs" class="{cs}"></p>'
+    return html, prefix, digest.hex()
+
+
+def naive_solve(prefix, expect):
+    # the solver before the prefix state reuse, kept as the baseline
+    for i in range(1000000):
+        if sha256(prefix + str(i).encode('utf-8')).hexdigest() == expect:
+            return i
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms")
+    return elapsed
+
+
+def main():
+    nonce = int(sys.argv[1]) if len(sys.argv) > 1 else 900000
+
+    print(f"nonce={nonce} workers={WAFSolver.workers}")
+    html, prefix, expect = make_challenge(nonce)
+    baseline = timed("naive loop", lambda: naive_solve(prefix, expect))
+
+    WAFSolver.workers = 1
+    html, _, _ = make_challenge(nonce)
+    single = timed("prefix state copy", lambda: WAFSolver.solve(html))
+
+    WAFSolver.workers = os.cpu_count() or 1
+    html, _, _ = make_challenge(nonce)
+    timed("process pool, first", lambda: WAFSolver.solve(html))
+    # the pool is kept, later challenges skip its start-up
+    html, _, _ = make_challenge(nonce)
+    parallel = timed("process pool", lambda: WAFSolver.solve(html))
+    cached = timed("cached prefix", lambda: WAFSolver.solve(html))
+
+    print(f"\nspeedup: copy x{baseline / single:.1f}, "
+          f"pool x{baseline / parallel:.1f}, "
+          f"cache x{baseline / max(cached, 1e-9):.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Local stand-in for the TikTok endpoints used by the recorder and for the
+FLV CDN, so benchmarks run without network access.
+
+Usage: python benchmarks/fake_tiktok.py [port] [users]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FLV_HEADER = b'FLV\x01\x05\x00\x00\x00\x09\x00\x00\x00\x00'
+FRAME_RATE = 25
+GOP_FRAMES = 2 * FRAME_RATE
+AUDIO_TAG_SIZE = 200
+# followers returned by a page of /api/user/list/
+PAGE_SIZE = 30
+ROOM_ID_BASE = 7400000000000000000
+# stream variants of a room: sdk_key, level and divisor of the bitrate
+QUALITIES = (('origin', 10, 1), ('hd', 4, 2), ('sd', 3, 4))
+
+
+def flv_tag(tag_type, timestamp, body):
+    header = (
+        bytes([tag_type]) + len(body).to_bytes(3, 'big') +
+        (timestamp & 0xFFFFFF).to_bytes(3, 'big') +
+        bytes([(timestamp >> 24) & 0xFF]) + b'\x00\x00\x00'
+    )
+    return header + body + (11 + len(body)).to_bytes(4, 'big')
+
+
+def flv_stream(bitrate, duration):
+    """
+    Yields an H.264/AAC shaped FLV stream of `duration` seconds at
+    `bitrate` kbps, one video and one audio tag per frame.
+    """
+    frame_size = max(bitrate * 1000 // 8 // FRAME_RATE - AUDIO_TAG_SIZE, 16)
+    payload = os.urandom(frame_size)
+    audio = b'\xaf\x01' + os.urandom(AUDIO_TAG_SIZE)
+
+    yield FLV_HEADER
+    yield flv_tag(18, 0, b'\x02\x00\x0aonMetaData\x08\x00\x00\x00\x00\x00\x00\x09')
+    yield flv_tag(9, 0, b'\x17\x00\x00\x00\x00\x01\x64\x00\x1f\xff')
+    yield flv_tag(8, 0, b'\xaf\x00\x12\x10')
+
+    for frame in range(duration * FRAME_RATE):
+        timestamp = frame * 1000 // FRAME_RATE
+        kind = b'\x17\x01' if frame % GOP_FRAMES == 0 else b'\x27\x01'
+        yield flv_tag(9, timestamp, kind + b'\x00\x00\x00' + payload)
+        yield flv_tag(8, timestamp, audio)
+
+
+class FakeTikTok:
+    """
+    Serves /api-live/user/room/, /webcast/room/check_alive/,
+    /webcast/room/info/, /api/user/list/ and FLV streams on /stream/.
+
+    Users are named user0..userN; every `live_every`-th one is live. The
+    stream of a room runs `duration` seconds at `bitrate` kbps, paced in
+    real time unless `realtime` is off. `latency` ms are added to every
+    API response to stand for the network.
+
+    Every variant has a backup edge on the `localhost` name of the
+    server; streams asked through a host of `down_hosts` fail with 503.
+    """
+
+    def __init__(self, users=100, live_every=10, bitrate=2000, duration=30,
+                 realtime=True, latency=0, host='127.0.0.1', port=0):
+        self.users = [f"user{i}" for i in range(users)]
+        self.known_users = set(self.users)
+        self.live_every = live_every
+        self.bitrate = bitrate
+        self.duration = duration
+        self.realtime = realtime
+        self.latency = latency / 1000
+        self.requests = 0
+        self.down_hosts = set()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_port}"
+        self.backup_url = f"http://localhost:{self.server.server_port}"
+
+    def room_id(self, user) -> int:
+        return ROOM_ID_BASE + int(user[len('user'):])
+
+    def is_live(self, room_id) -> bool:
+        index = int(room_id) - ROOM_ID_BASE
+        return 0 <= index < len(self.users) and index % self.live_every == 0
+
+    def start(self):
+        threading.Thread(
+            target=self.server.serve_forever, name="fake-tiktok", daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                fake.requests += 1
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+                if url.path.startswith('/stream/'):
+                    self._stream(query)
+                    return
+
+                routes = {
+                    '/api-live/user/room/': fake._room,
+                    '/webcast/room/check_alive/': fake._check_alive,
+                    '/webcast/room/info/': fake._room_info,
+                    '/api/user/list/': fake._user_list,
+                }
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                if url.path in routes:
+                    self._send(json.dumps(routes[url.path](query)).encode(),
+                               'application/json')
+                elif url.path == '/foryou':
+                    self._send(b'<script>{"secUid":"fake-sec-uid","x":1}</script>',
+                               'text/html')
+                elif url.path == '/live':
+                    self._send(b'<html></html>', 'text/html')
+                else:
+                    self.send_error(404)
+
+            def _send(self, body, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, query):
+                if self.headers.get('Host', '').split(':')[0] in fake.down_hosts:
+                    self.send_error(503)
+                    return
+
+                bitrate = int(query.get('bitrate', fake.bitrate))
+                duration = int(query.get('duration', fake.duration))
+                realtime = query.get('realtime', '1' if fake.realtime else '0') == '1'
+
+                # no length, the stream ends when the connection closes
+                self.send_response(200)
+                self.send_header('Content-Type', 'video/x-flv')
+                self.end_headers()
+
+                start = time.monotonic()
+                sent = 0
+                try:
+                    for tag in flv_stream(bitrate, duration):
+                        self.wfile.write(tag)
+                        sent += len(tag)
+                        if realtime:
+                            delay = start + sent * 8 / (bitrate * 1000) - \
+                                time.monotonic()
+                            if delay > 0:
+                                time.sleep(delay)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _room(self, query):
+        user = query.get('uniqueId', '')
+        if user not in self.known_users:
+            return {'data': {}}
+        return {'data': {'user': {'roomId': str(self.room_id(user))}}}
+
+    def _check_alive(self, query):
+        room_ids = [r for r in query.get('room_ids', '').split(',') if r]
+        return {'data': [
+            {'room_id_str': room_id, 'alive': self.is_live(room_id)}
+            for room_id in room_ids
+        ]}
+
+    def _room_info(self, query):
+        room_id = query.get('room_id', '0')
+        user = f"user{int(room_id) - ROOM_ID_BASE}"
+        stream_data = {'data': {
+            sdk_key: {
+                'main': {
+                    'flv': f"{self.url}/stream/{room_id}.flv"
+                           f"?bitrate={self.bitrate // divisor}",
+                    'sdk_params': json.dumps(
+                        {'vbitrate': self.bitrate * 1000 // divisor}),
+                },
+                'backup': {
+                    'flv': f"{self.backup_url}/stream/{room_id}.flv"
+                           f"?bitrate={self.bitrate // divisor}",
+                },
+            }
+            for sdk_key, _, divisor in QUALITIES
+        }}
+        return {
+            'status_code': 0,
+            'data': {
+                'owner': {'display_id': user},
+                'status': 2 if self.is_live(room_id) else 4,
+                'stream_url': {'live_core_sdk_data': {'pull_data': {
+                    'stream_data': json.dumps(stream_data),
+                    'options': {'qualities': [
+                        {'sdk_key': sdk_key, 'level': level}
+                        for sdk_key, level, _ in QUALITIES
+                    ]},
+                }}},
+            },
+        }
+
+    def _user_list(self, query):
+        cursor = int(query.get('maxCursor', 0))
+        page = self.users[cursor:cursor + PAGE_SIZE]
+        next_cursor = cursor + len(page)
+        return {
+            'userList': [{'user': {'uniqueId': user}} for user in page],
+            'hasMore': next_cursor < len(self.users),
+            'minCursor': next_cursor,
+            'maxCursor': next_cursor,
+        }
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    fake = FakeTikTok(users=users, port=port).start()
+    print(f"Fake TikTok listening on {fake.url} with {users} users")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from utils.logger_manager import logger
+from utils.custom_exceptions import TikTokRecorderError
+
+
+# any other Host is a web page that rebound its DNS name to us
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of a recorder daemon:
+
+        GET    /users          watched users and their state
+        POST   /users          {"user": name, "interval": minutes}
+        DELETE /users/<name>   stop watching, ending its recording
+        POST   /stop           end every recording and exit
+
+    Requests must name a loopback Host, and requests that change state
+    must be JSON: a web page can send neither without a preflight the
+    server doesn't answer.
+    """
+
+    def do_GET(self):
+        if not self._allowed():
+            return
+
+        if self._path() == '/users':
+            self._send(200, {'users': self.server.supervisor.status()})
+        else:
+            self._send(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if not self._allowed(json_body=True):
+            return
+
+        path = self._path()
+        if path == '/stop':
+            self._send(202, {'message': 'Stopping'})
+            self.server.supervisor.stop()
+            return
+
+        if path != '/users':
+            self._send(404, {'error': 'Not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            user = str(body.get('user') or '').lstrip('@').strip()
+            interval = body.get('interval')
+            interval = int(interval) if interval is not None else None
+        except (ValueError, TypeError, AttributeError):
+            self._send(400, {'error': 'Invalid JSON body'})
+            return
+
+        if not user:
+            self._send(400, {'error': 'Username is required'})
+            return
+        if interval is not None and interval < 1:
+            self._send(400, {'error': 'Interval must be one minute or more'})
+            return
+
+        try:
+            added = self.server.supervisor.add_user(user, interval)
+        except TikTokRecorderError as ex:
+            self._send(503, {'error': str(ex)})
+            return
+
+        if added:
+            self._send(201, {'user': user})
+        else:
+            self._send(409, {'error': 'User is already being watched'})
+
+    def do_DELETE(self):
+        if not self._allowed(json_body=True):
+            return
+
+        path = self._path()
+        if not path.startswith('/users/'):
+            self._send(404, {'error': 'Not found'})
+            return
+
+        user = unquote(path[len('/users/'):]).lstrip('@')
+        if self.server.supervisor.remove_user(user):
+            self._send(200, {'user': user})
+        else:
+            self._send(404, {'error': 'User is not being watched'})
+
+    def _allowed(self, json_body=False) -> bool:
+        """
+        Rejects requests from other origins, answering them itself.
+        """
+        try:
+            host = urlsplit('//' + (self.headers.get('Host') or '')).hostname
+        except ValueError:
+            host = None
+        if host not in LOOPBACK_HOSTS:
+            self._send(403, {'error': 'Forbidden host'})
+            return False
+
+        content_type = self.headers.get('Content-Type') or ''
+        if json_body and \
+                content_type.split(';')[0].strip().lower() != 'application/json':
+            self._send(415, {'error': 'Content-Type must be application/json'})
+            return False
+
+        return True
+
+    def _path(self) -> str:
+        return self.path.split('?')[0].rstrip('/') or '/'
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # status polls would flood the recorder logs
+
+
+class ControlServer:
+    """
+    Serves the control API of a supervisor from a daemon thread, on the
+    loopback interface only.
+    """
+
+    host = '127.0.0.1'
+
+    @classmethod
+    def start(cls, supervisor, port):
+        try:
+            server = ThreadingHTTPServer((cls.host, port), ControlHandler)
+        except OSError as ex:
+            raise TikTokRecorderError(f"Control API not started: {ex}")
+
+        server.daemon_threads = True
+        server.supervisor = supervisor
+        threading.Thread(
+            target=server.serve_forever, name="control", daemon=True
+        ).start()
+        logger.info(f"Control API listening on http://{cls.host}:{port}")
+        return server
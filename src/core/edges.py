@@ -0,0 +1,223 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+from utils.logger_manager import logger
+
+
+# weight of the last time to first byte of an edge
+TTFB_SMOOTHING = 0.3
+# seconds a failed edge is tried after the others
+FAILURE_COOLDOWN = 60
+# seconds of stream the throughput of a connection is measured over
+HEDGE_WINDOW = 5
+
+
+def edge_host(url) -> str:
+    return urlsplit(url).netloc
+
+
+class EdgeStats:
+    """
+    Time to first byte and last failure of every CDN host seen by the
+    recordings of the process, to try the best edges first.
+    """
+
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ttfb = {}  # host -> smoothed seconds
+        self.failed_at = {}  # host -> monotonic time
+
+    def connected(self, url, ttfb):
+        host = edge_host(url)
+        with self.lock:
+            average = self.ttfb.get(host)
+            self.ttfb[host] = ttfb if average is None else \
+                average + TTFB_SMOOTHING * (ttfb - average)
+            self.failed_at.pop(host, None)
+
+    def failed(self, url):
+        with self.lock:
+            self.failed_at[edge_host(url)] = time.monotonic()
+
+    def order(self, urls) -> list:
+        """
+        Sorts the edges of a stream: recently failed ones last, then by
+        time to first byte. Unmeasured edges keep the order of the API
+        and go first, so they get measured.
+        """
+        now = time.monotonic()
+        with self.lock:
+            def key(url):
+                host = edge_host(url)
+                failed_at = self.failed_at.get(host)
+                recently_failed = failed_at is not None and \
+                    now - failed_at < FAILURE_COOLDOWN
+                return recently_failed, self.ttfb.get(host, 0)
+
+            return sorted(urls, key=key)
+
+
+class HedgedConnection:
+    """
+    Second connection to the stream, opened in the background on
+    another edge while the current one is slow.
+    """
+
+    def __init__(self, open_stream, url):
+        self.url = url
+        self.response = None
+        self.ttfb = None
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.done = threading.Event()
+
+        threading.Thread(
+            target=self._open, args=(open_stream,), name="hedge", daemon=True
+        ).start()
+
+    def _open(self, open_stream):
+        start = time.perf_counter()
+        try:
+            response = open_stream(self.url)
+        except Exception:
+            self.done.set()
+            return
+
+        with self.lock:
+            if self.cancelled:
+                response.close()
+            else:
+                self.response = response
+                self.ttfb = time.perf_counter() - start
+        self.done.set()
+
+    def ready(self) -> bool:
+        return self.done.is_set() and self.response is not None
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            response, self.response = self.response, None
+        if response:
+            response.close()
+
+
+class EdgeSelector:
+    """
+    Edges a recording connects to: the main and backup URLs of the
+    recorded variant, best first.
+
+    A failed connection moves to the next edge without asking the API
+    for new URLs. With a hedging threshold, a connection running below
+    it opens a second one on the next edge, and the recording switches
+    over once that one answers.
+    """
+
+    hedge_below = None  # bits per second
+
+    @classmethod
+    def configure(cls, hedge_below=None):
+        cls.hedge_below = hedge_below
+
+    def __init__(self, urls, open_stream, stats=None):
+        self.stats = stats or EdgeStats.shared()
+        self.urls = self.stats.order(urls)
+        self.open_stream = open_stream
+        self.index = 0
+        self.hedge = None
+        self.window_start = None
+        self.window_bytes = 0
+
+    @property
+    def current(self) -> str:
+        return self.urls[self.index]
+
+    def connect(self):
+        """
+        Opens the stream on the current edge, or returns the hedged
+        connection when it is ready.
+        """
+        if self.hedge_ready():
+            hedge, self.hedge = self.hedge, None
+            self.index = self.urls.index(hedge.url)
+            self.stats.connected(hedge.url, hedge.ttfb)
+            logger.info(f"Switched to the faster edge {edge_host(hedge.url)}")
+            self._reset_window()
+            return hedge.response
+
+        self.cancel_hedge()
+        start = time.perf_counter()
+        response = self.open_stream(self.current)
+        self.stats.connected(self.current, time.perf_counter() - start)
+        self._reset_window()
+        return response
+
+    def failed(self):
+        """
+        The current edge failed, the next connection goes to another one.
+        """
+        self.stats.failed(self.current)
+        if len(self.urls) > 1:
+            self.index = (self.index + 1) % len(self.urls)
+            logger.info(f"Failing over to the edge {edge_host(self.current)}")
+
+    def hedge_ready(self) -> bool:
+        return self.hedge is not None and self.hedge.ready()
+
+    def should_switch(self, total_bytes) -> bool:
+        """
+        Called as the stream is read. Starts a hedged connection when the
+        throughput of the last HEDGE_WINDOW seconds is below the
+        threshold, returns True once it is ready to take over.
+        """
+        if not self.hedge_below or len(self.urls) < 2:
+            return False
+
+        if self.hedge_ready():
+            return True
+
+        if self.hedge:
+            if self.hedge.done.is_set():
+                # the other edge didn't answer, stay on this one
+                self.stats.failed(self.hedge.url)
+                self.hedge = None
+            return False
+
+        now = time.monotonic()
+        if self.window_start is None:
+            self.window_start, self.window_bytes = now, total_bytes
+            return False
+
+        elapsed = now - self.window_start
+        if elapsed < HEDGE_WINDOW:
+            return False
+
+        throughput = (total_bytes - self.window_bytes) * 8 / elapsed
+        self.window_start, self.window_bytes = now, total_bytes
+        if throughput < self.hedge_below:
+            url = self.urls[(self.index + 1) % len(self.urls)]
+            logger.info(
+                f"Stream at {throughput / 1000:.0f} kbps on "
+                f"{edge_host(self.current)}, trying {edge_host(url)}")
+            self.hedge = HedgedConnection(self.open_stream, url)
+        return False
+
+    def cancel_hedge(self):
+        if self.hedge:
+            self.hedge.cancel()
+            self.hedge = None
+
+    def _reset_window(self):
+        self.window_start = None
+        self.window_bytes = 0
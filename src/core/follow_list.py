@@ -0,0 +1,145 @@
+import threading
+import time
+
+from utils.custom_exceptions import TikTokRecorderError
+from utils.logger_manager import logger
+from utils.storage import open_database
+
+
+# every this many refreshes the whole list is paged to drop unfollows
+FULL_SYNC_EVERY = 6
+
+
+class FollowList:
+    """
+    Local copy of the accounts followed by the authenticated user, so a
+    followers sweep starts checking lives right away.
+
+    The copy is refreshed in a background thread on its own schedule.
+    New follows come first in the list, so a refresh stops at the first
+    page made only of known accounts, usually after one request; every
+    FULL_SYNC_EVERY refreshes all pages are read to drop unfollows.
+    """
+
+    refresh_interval = 30 * 60  # seconds
+
+    @classmethod
+    def configure(cls, refresh_interval=None):
+        if refresh_interval:
+            cls.refresh_interval = refresh_interval
+
+    def __init__(self, tiktok, sec_uid, path=None):
+        self.tiktok = tiktok
+        self.sec_uid = sec_uid
+        self.lock = threading.Lock()
+        self.thread = None
+
+        self.conn = open_database(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS follow_list ("
+            "sec_uid TEXT NOT NULL, "
+            "username TEXT NOT NULL, "
+            "added_at REAL NOT NULL, "
+            "PRIMARY KEY (sec_uid, username))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS follow_sync ("
+            "sec_uid TEXT PRIMARY KEY, "
+            "synced_at REAL NOT NULL, "
+            "full_synced_at REAL NOT NULL)"
+        )
+
+    def users(self) -> list:
+        """
+        Returns the followed accounts, syncing first only when nothing is
+        stored yet. A refresh is started in the background when due.
+        """
+        users = self._load()
+        if not users:
+            self.sync(full=True)
+            users = self._load()
+        elif self._refresh_due() and not self._syncing():
+            self.thread = threading.Thread(
+                target=self._background_sync, name="follow-sync", daemon=True)
+            self.thread.start()
+
+        if not users:
+            raise TikTokRecorderError("Followers list is empty.")
+        return users
+
+    def sync(self, full=False):
+        """
+        Fetches the newest pages of the list, or all of them when full.
+        """
+        known = set(self._load())
+        seen = []
+        cursor = 0
+
+        while True:
+            page, has_more, next_cursor = \
+                self.tiktok.get_followers_page(self.sec_uid, cursor)
+            seen.extend(page)
+
+            if not full and page and known.issuperset(page):
+                break
+            if not has_more or next_cursor == cursor:
+                break
+            cursor = next_cursor
+
+        added = [user for user in dict.fromkeys(seen) if user not in known]
+        removed = known.difference(seen) if full else set()
+
+        now = time.time()
+        full_synced_at = now if full else self._sync_times()[1]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO follow_list (sec_uid, username, "
+                "added_at) VALUES (?, ?, ?)",
+                [(self.sec_uid, user, now) for user in added]
+            )
+            self.conn.executemany(
+                "DELETE FROM follow_list WHERE sec_uid = ? AND username = ?",
+                [(self.sec_uid, user) for user in removed]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO follow_sync (sec_uid, synced_at, "
+                "full_synced_at) VALUES (?, ?, ?)",
+                (self.sec_uid, now, full_synced_at)
+            )
+
+        if added or removed:
+            logger.info(f"Followers list updated: {len(added)} added, "
+                        f"{len(removed)} removed")
+
+    def _background_sync(self):
+        _, full_synced_at = self._sync_times()
+        full = time.time() - full_synced_at >= \
+            self.refresh_interval * FULL_SYNC_EVERY
+        try:
+            self.sync(full=full)
+        except Exception as ex:
+            # the stored list is still used, retried at the next sweep
+            logger.error(f"Followers list refresh failed: {ex}")
+
+    def _syncing(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def _refresh_due(self) -> bool:
+        synced_at, _ = self._sync_times()
+        return time.time() - synced_at >= self.refresh_interval
+
+    def _sync_times(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT synced_at, full_synced_at FROM follow_sync "
+                "WHERE sec_uid = ?", (self.sec_uid,)
+            ).fetchone()
+        return row or (0, 0)
+
+    def _load(self) -> list:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT username FROM follow_list WHERE sec_uid = ? "
+                "ORDER BY added_at DESC, username", (self.sec_uid,)
+            ).fetchall()
+        return [username for username, in rows]
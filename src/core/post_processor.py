@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.recording_store import RecordingStore, RecordingState
+from utils.events import Event, EventEmitter
+from utils.logger_manager import logger
+from utils.storage import open_database, add_column
+from utils.utils import owner_token, is_owner_running
+from utils.video_management import VideoManagement
+
+
+class JobStage:
+    CONVERT = 'convert'
+    UPLOAD = 'upload'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class PostProcessor:
+    """
+    Converts and uploads finished recordings in background workers, so
+    the recorder can go back to monitoring right away.
+
+    Jobs are stored in the local database and resumed after a restart.
+    Conversion and upload have separate pools with their own size.
+    """
+
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    convert_workers = 1
+    upload_workers = 1
+
+    @classmethod
+    def configure(cls, convert_workers=1, upload_workers=1):
+        cls.convert_workers = convert_workers
+        cls.upload_workers = upload_workers
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, path=None):
+        self.lock = threading.Lock()
+        self.conn = open_database(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS post_jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "file TEXT NOT NULL, "
+            "stage TEXT NOT NULL, "
+            "use_telegram INTEGER NOT NULL, "
+            "pid INTEGER NOT NULL, "
+            "owner TEXT, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        add_column(self.conn, 'post_jobs', 'owner', 'TEXT')
+
+        self.convert_pool = ThreadPoolExecutor(
+            self.convert_workers, thread_name_prefix="convert")
+        self.upload_pool = ThreadPoolExecutor(
+            self.upload_workers, thread_name_prefix="upload")
+
+        self.resume()
+
+    def submit(self, file, use_telegram=False):
+        """
+        Queues a finished recording for conversion and optional upload.
+        """
+        now = time.time()
+        with self.lock:
+            job_id = self.conn.execute(
+                "INSERT INTO post_jobs (file, stage, use_telegram, pid, "
+                "owner, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file, JobStage.CONVERT, int(use_telegram), os.getpid(),
+                 owner_token(), now, now)
+            ).lastrowid
+
+        self._schedule(job_id, file, JobStage.CONVERT, use_telegram)
+
+    def resume(self):
+        """
+        Takes over the unfinished jobs of runs that are gone.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, file, stage, use_telegram, owner FROM post_jobs "
+                "WHERE stage IN (?, ?)", (JobStage.CONVERT, JobStage.UPLOAD)
+            ).fetchall()
+
+            jobs = []
+            for job_id, file, stage, use_telegram, owner in rows:
+                if is_owner_running(owner):
+                    continue
+                # several processes may start at once, one takes the job
+                claimed = self.conn.execute(
+                    "UPDATE post_jobs SET pid = ?, owner = ? "
+                    "WHERE id = ? AND owner IS ?",
+                    (os.getpid(), owner_token(), job_id, owner)
+                ).rowcount
+                if not claimed:
+                    continue
+                jobs.append((job_id, file, stage, bool(use_telegram)))
+
+        for job in jobs:
+            logger.info(f"Resuming post-processing of {job[1]}")
+            self._schedule(*job)
+
+        # recordings cut by a crash are processed like finished ones
+        for file, use_telegram in RecordingStore.shared().recover():
+            self.submit(file, use_telegram)
+
+    def wait(self):
+        """
+        Blocks until every queued job is done.
+        """
+        self.convert_pool.shutdown(wait=True)
+        self.upload_pool.shutdown(wait=True)
+
+    def _schedule(self, job_id, file, stage, use_telegram):
+        if stage == JobStage.CONVERT:
+            self.convert_pool.submit(
+                self._convert, job_id, file, use_telegram)
+        elif stage == JobStage.UPLOAD:
+            self.upload_pool.submit(self._upload, job_id, file)
+
+    def _set_stage(self, job_id, stage):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE post_jobs SET stage = ?, updated_at = ? WHERE id = ?",
+                (stage, time.time(), job_id)
+            )
+
+    def _convert(self, job_id, file, use_telegram):
+        try:
+            VideoManagement.convert_flv_to_mp4(file)
+            converted = file.replace('_flv.mp4', '.mp4')
+
+            if not os.path.exists(converted):
+                EventEmitter.shared().emit(Event.CONVERSION_FAILED, file=file)
+                self._set_stage(job_id, JobStage.FAILED)
+                RecordingStore.shared().set_state(file, RecordingState.FAILED)
+                return
+
+            EventEmitter.shared().emit(
+                Event.CONVERSION_FINISHED, file=file, output=converted)
+            RecordingStore.shared().set_state(file, RecordingState.CONVERTED)
+
+            if use_telegram:
+                self._set_stage(job_id, JobStage.UPLOAD)
+                # keyed like resumed jobs, by the recorded file
+                self.upload_pool.submit(self._upload, job_id, file)
+            else:
+                self._set_stage(job_id, JobStage.DONE)
+
+        except Exception as ex:
+            logger.error(f"Post-processing of {file} failed: {ex}")
+            EventEmitter.shared().emit(Event.CONVERSION_FAILED, file=file)
+            self._set_stage(job_id, JobStage.FAILED)
+            RecordingStore.shared().set_state(file, RecordingState.FAILED)
+
+    def _upload(self, job_id, file):
+        # pyrogram takes most of the startup time, load it only to upload
+        from upload.telegram import Telegram
+        try:
+            uploaded = Telegram.shared().upload(
+                file.replace('_flv.mp4', '.mp4'))
+
+        except Exception as ex:
+            logger.error(f"Upload of {file} failed: {ex}")
+            uploaded = False
+
+        EventEmitter.shared().emit(
+            Event.UPLOAD_FINISHED if uploaded else Event.UPLOAD_FAILED,
+            file=file)
+        self._set_stage(job_id, JobStage.DONE if uploaded else JobStage.FAILED)
+        RecordingStore.shared().set_state(
+            file,
+            RecordingState.UPLOADED if uploaded else RecordingState.FAILED)
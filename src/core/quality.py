@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import namedtuple
+
+from utils.logger_manager import logger
+
+
+# sdk keys of the TikTok stream variants, from lowest to highest quality
+QUALITY_ORDER = ('ld', 'sd', 'hd', 'uhd', 'origin')
+AUDIO_ONLY = 'ao'
+# names of the legacy flv_pull_url variants as sdk keys
+LEGACY_QUALITIES = {'FULL_HD1': 'uhd', 'HD1': 'hd', 'SD2': 'sd', 'SD1': 'ld'}
+
+# a variant of unknown bitrate is only taken below this share of the budget
+NEAR_CAP = 0.8
+# seconds between two measures of a stream, and weight of the last one
+MEASURE_INTERVAL = 5
+SMOOTHING = 0.3
+
+# bitrate in bits per second, None when the API doesn't tell; urls are
+# the main and backup edges serving the variant, url the main one
+StreamVariant = namedtuple('StreamVariant', 'sdk_key level url bitrate urls')
+
+
+class QualityPolicy:
+    """
+    Picks the variant of each live to record.
+
+    The highest variant is taken up to the maximum quality, set for all
+    users or for some of them. With a bandwidth budget, the bitrate
+    measured on the recordings in progress is added up and lower
+    variants are taken when the next stream would not fit, so recordings
+    on a capped uplink don't all stall together. The budget is shared
+    by the recordings of the process.
+    """
+
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    max_quality = None  # sdk key
+    user_qualities = {}  # user -> sdk key
+    bandwidth = None  # bits per second
+
+    @classmethod
+    def configure(cls, max_quality=None, user_qualities=None, bandwidth=None):
+        cls.max_quality = max_quality
+        cls.user_qualities = dict(user_qualities or {})
+        cls.bandwidth = bandwidth
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = {}  # key -> [sdk_key, bitrate, measured_at, bytes]
+        self.averages = {}  # sdk_key -> measured bitrate
+
+    def choose(self, user, variants) -> StreamVariant:
+        """
+        Returns the variant to record among those of a live, sorted from
+        the highest level.
+        """
+        candidates = [v for v in variants if v.sdk_key != AUDIO_ONLY] \
+            or variants
+
+        cap = self.user_qualities.get(user, self.max_quality)
+        if cap:
+            allowed = [
+                v for v in candidates
+                if v.sdk_key in QUALITY_ORDER and
+                QUALITY_ORDER.index(v.sdk_key) <= QUALITY_ORDER.index(cap)
+            ] or candidates[-1:]
+        else:
+            allowed = candidates
+
+        if not self.bandwidth:
+            return allowed[0]
+
+        used = self.used()
+        for variant in allowed:
+            estimate = self.estimate(variant)
+            if estimate is None:
+                fits = used < self.bandwidth * NEAR_CAP
+            else:
+                fits = used + estimate <= self.bandwidth
+            if fits:
+                break
+        else:
+            variant = allowed[-1]
+
+        if variant is not allowed[0]:
+            logger.info(
+                f"Recording @{user} in {variant.sdk_key} quality, "
+                f"{used / 1e6:.1f} of {self.bandwidth / 1e6:.1f} Mbps in use")
+        return variant
+
+    def estimate(self, variant):
+        """
+        Expected bitrate of a variant: measured on earlier recordings,
+        or announced by the API.
+        """
+        with self.lock:
+            return self.averages.get(variant.sdk_key, variant.bitrate)
+
+    def used(self) -> float:
+        """
+        Bitrate of the recordings in progress, the expected one for
+        streams not measured yet.
+        """
+        with self.lock:
+            return sum(
+                bitrate or self.averages.get(sdk_key, 0)
+                for sdk_key, bitrate, _, _ in self.streams.values()
+            )
+
+    def start(self, key, variant):
+        with self.lock:
+            self.streams[key] = [
+                variant.sdk_key, variant.bitrate, time.monotonic(), 0]
+
+    def update(self, key, total_bytes):
+        """
+        Measures the bitrate of a recording from its received bytes, at
+        most once every MEASURE_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None:
+                return
+
+            sdk_key, bitrate, measured_at, last_bytes = stream
+            elapsed = now - measured_at
+            if elapsed < MEASURE_INTERVAL:
+                return
+
+            measure = (total_bytes - last_bytes) * 8 / elapsed
+            # the announced bitrate is a guess, the first measure replaces it
+            stream[1] = measure if last_bytes == 0 else \
+                bitrate + SMOOTHING * (measure - bitrate)
+            stream[2] = now
+            stream[3] = total_bytes
+
+            average = self.averages.get(sdk_key)
+            self.averages[sdk_key] = stream[1] if average is None else \
+                average + SMOOTHING * (stream[1] - average)
+
+    def stop(self, key):
+        with self.lock:
+            self.streams.pop(key, None)
@@ -0,0 +1,69 @@
+import random
+import time
+
+
+class ReconnectPolicy:
+    """
+    Reconnect state machine of a recording.
+
+    A dropped connection is retried right away with exponential backoff
+    and jitter; the API is only asked whether the live is still going
+    after the stream ended cleanly or after repeated failures.
+    """
+
+    def __init__(self, base_delay=0.5, max_delay=30, check_after=3):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.check_after = check_after
+
+        self.failures = 0  # since the last liveness check
+        self.attempts = 0  # since data last flowed, drives the backoff
+        self.clean_end = False
+
+        # exposed per recording
+        self.reconnects = 0
+        self.lost_seconds = 0.0
+        self._disconnected_at = None
+        self._connected_before = False
+
+    def should_check_liveness(self) -> bool:
+        return self.clean_end or self.failures >= self.check_after
+
+    def on_alive(self):
+        """
+        The API confirmed the live is still going.
+        """
+        self.failures = 0
+        self.clean_end = False
+
+    def delay(self) -> float:
+        """
+        Seconds to wait before the next connection attempt.
+        """
+        if not self.attempts or self.clean_end:
+            return 0
+
+        delay = min(self.max_delay,
+                    self.base_delay * 2 ** (self.attempts - 1))
+        return delay * random.uniform(0.5, 1.5)
+
+    def on_connected(self):
+        if self._disconnected_at is not None:
+            self.lost_seconds += time.monotonic() - self._disconnected_at
+            self._disconnected_at = None
+
+        if self._connected_before:
+            self.reconnects += 1
+
+        self._connected_before = True
+        self.attempts = 0
+
+    def on_disconnected(self, clean=False):
+        if self._disconnected_at is None:
+            self._disconnected_at = time.monotonic()
+
+        if clean:
+            self.clean_end = True
+        else:
+            self.failures += 1
+            self.attempts += 1
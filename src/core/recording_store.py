@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+from utils.logger_manager import logger
+from utils.storage import open_database, add_column
+from utils.utils import owner_token, is_owner_running
+
+
+# seconds between two saves of the size of a recording in progress
+SAVE_INTERVAL = 10
+
+
+class RecordingState:
+    RECORDING = 'recording'
+    FINISHED = 'finished'
+    CONVERTED = 'converted'
+    UPLOADED = 'uploaded'
+    FAILED = 'failed'
+
+
+class RecordingStore:
+    """
+    Lifecycle of every recording file in the local database, from the
+    first byte to the upload.
+
+    A file still marked as recording by a run that is gone was cut by a
+    crash: recover() returns it to be post-processed like a
+    finished recording. Only the files listed in the database are
+    looked at, the output directory is never scanned.
+    """
+
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, path=None):
+        self.lock = threading.Lock()
+        self.saved_at = {}  # file -> last save of its size
+        self.conn = open_database(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS recordings ("
+            "file TEXT PRIMARY KEY, "
+            "user TEXT NOT NULL, "
+            "state TEXT NOT NULL, "
+            "bytes INTEGER NOT NULL, "
+            "use_telegram INTEGER NOT NULL, "
+            "pid INTEGER NOT NULL, "
+            "owner TEXT, "
+            "started_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        add_column(self.conn, 'recordings', 'owner', 'TEXT')
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS recordings_state "
+            "ON recordings (state)"
+        )
+
+    def started(self, user, file, use_telegram=False):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO recordings (file, user, state, "
+                "bytes, use_telegram, pid, owner, started_at, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?)",
+                (file, user, RecordingState.RECORDING, int(use_telegram),
+                 os.getpid(), owner_token(), now, now)
+            )
+            self.saved_at[file] = time.monotonic()
+
+    def progress(self, file, total_bytes):
+        """
+        Saves the size of a recording in progress, at most once every
+        SAVE_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        if now - self.saved_at.get(file, 0) < SAVE_INTERVAL:
+            return
+        self.saved_at[file] = now
+        self._update(file, bytes=total_bytes)
+
+    def finished(self, file, total_bytes=None):
+        self.saved_at.pop(file, None)
+        self._update(file, RecordingState.FINISHED, total_bytes)
+
+    def set_state(self, file, state):
+        self._update(file, state)
+
+    def _update(self, file, state=None, bytes=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE recordings SET state = COALESCE(?, state), "
+                "bytes = COALESCE(?, bytes), updated_at = ? WHERE file = ?",
+                (state, bytes, time.time(), file)
+            )
+
+    def recover(self) -> list:
+        """
+        Finalizes the recordings left behind by runs that are gone.
+        Returns the (file, use_telegram) of the non-empty ones, missing or
+        empty files are marked as failed.
+        """
+        recovered = []
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT file, use_telegram, owner FROM recordings "
+                "WHERE state = ?", (RecordingState.RECORDING,)
+            ).fetchall()
+
+        for file, use_telegram, owner in rows:
+            if is_owner_running(owner):
+                continue
+
+            # several processes may start at once, one takes the file
+            with self.lock:
+                claimed = self.conn.execute(
+                    "UPDATE recordings SET pid = ?, owner = ? WHERE file = ? "
+                    "AND owner IS ? AND state = ?",
+                    (os.getpid(), owner_token(), file, owner,
+                     RecordingState.RECORDING)
+                ).rowcount
+            if not claimed:
+                continue
+
+            size = os.path.getsize(file) if os.path.exists(file) else 0
+            if not size:
+                logger.error(f"Interrupted recording {file} has no data")
+                if os.path.exists(file):
+                    os.remove(file)
+                self.set_state(file, RecordingState.FAILED)
+                continue
+
+            logger.info(f"Recovering interrupted recording {file}")
+            self.finished(file, size)
+            recovered.append((file, bool(use_telegram)))
+
+        return recovered
@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+
+from core.quality import StreamVariant, LEGACY_QUALITIES
+from utils.enums import TikTokError
+from utils.logger_manager import logger
+from utils.custom_exceptions import UserLiveError, TikTokRecorderError
+
+
+# seconds a room/info response is reused, short enough for stream URLs
+ROOM_INFO_TTL = 10
+# snapshots kept before the expired ones are dropped
+ROOM_INFO_MAX_ENTRIES = 1000
+
+# value of data.status while the room is live
+ROOM_STATUS_LIVE = 2
+# status_code of a live restricted to some viewers
+LIVE_RESTRICTION_CODE = 4003110
+
+
+class RoomSnapshot:
+    """
+    Everything a single /webcast/room/info/ response tells about a room:
+    owner, privacy, live status and stream variants.
+    """
+
+    def __init__(self, room_id, data):
+        self.room_id = str(room_id)
+        self.data = data
+        self.fetched_at = time.monotonic()
+
+        room = data.get('data') or {}
+        self.user = (room.get('owner') or {}).get('display_id')
+        self.status = room.get('status')
+        self.status_code = data.get('status_code')
+        self.stream_url = room.get('stream_url') or {}
+
+        self.private = 'This account is private' in data
+        self.follow_only = \
+            'Follow the creator to watch their LIVE' in json.dumps(data)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    @property
+    def alive(self):
+        """
+        Whether the room is live, None if the response doesn't tell.
+        """
+        if self.status is None:
+            return None
+        return self.status == ROOM_STATUS_LIVE
+
+    def username(self) -> str:
+        if self.follow_only:
+            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE_FOLLOW)
+
+        if self.private:
+            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE)
+
+        if self.user is None:
+            raise TikTokRecorderError(TikTokError.USERNAME_ERROR)
+
+        return self.user
+
+    def variants(self) -> list:
+        """
+        Returns the FLV variants of the live, sorted from the highest
+        quality level.
+        """
+        if self.private:
+            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE)
+
+        stream_url = self.stream_url
+        sdk_data_str = stream_url.get('live_core_sdk_data', {}).get('pull_data', {}).get('stream_data')
+        if not sdk_data_str:
+            logger.warning("No SDK stream data found. Falling back to legacy URLs. Consider contacting the developer to update the code.")
+            flv_urls = stream_url.get('flv_pull_url', {})
+            # listed from the best, which gets the highest level
+            variants = [
+                StreamVariant(sdk_key, level, flv_urls[name], None,
+                              (flv_urls[name],))
+                for level, (name, sdk_key) in zip(
+                    range(len(LEGACY_QUALITIES), 0, -1),
+                    LEGACY_QUALITIES.items())
+                if flv_urls.get(name)
+            ]
+            if not variants and stream_url.get('rtmp_pull_url'):
+                variants = [StreamVariant(
+                    None, 0, stream_url['rtmp_pull_url'], None,
+                    (stream_url['rtmp_pull_url'],))]
+            return variants
+
+        # Extract stream options
+        sdk_data = json.loads(sdk_data_str).get('data', {})
+        qualities = stream_url.get('live_core_sdk_data', {}).get('pull_data', {}).get('options', {}).get('qualities', [])
+        if not qualities:
+            logger.warning("No qualities found in the stream data.")
+            return []
+        level_map = {q['sdk_key']: q['level'] for q in qualities}
+
+        variants = []
+        for sdk_key, entry in sdk_data.items():
+            stream_main = entry.get('main', {})
+            # the same variant served from other CDN edges
+            urls = [stream_main.get('flv')] + [
+                (entry.get(name) or {}).get('flv')
+                for name in sorted(entry) if name.startswith('backup')
+            ]
+            urls = tuple(dict.fromkeys(url for url in urls if url))
+            if not urls:
+                continue
+            variants.append(StreamVariant(
+                sdk_key,
+                level_map.get(sdk_key, -1),
+                urls[0],
+                self._announced_bitrate(stream_main),
+                urls
+            ))
+
+        if not variants and self.status_code == LIVE_RESTRICTION_CODE:
+            raise UserLiveError(TikTokError.LIVE_RESTRICTION)
+
+        return sorted(variants, key=lambda v: v.level, reverse=True)
+
+    @staticmethod
+    def _announced_bitrate(stream_main):
+        try:
+            params = json.loads(stream_main.get('sdk_params') or '{}')
+            return int(params['vbitrate']) or None
+        except (ValueError, TypeError, KeyError):
+            return None
+
+
+class RoomInfoCache:
+    """
+    In-memory room_id -> RoomSnapshot cache with a short TTL, so the
+    username, the live status and the stream URLs of a room come from
+    one request.
+    """
+
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, ttl=ROOM_INFO_TTL, max_entries=ROOM_INFO_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.snapshots = {}  # room_id -> RoomSnapshot
+
+    def get(self, room_id, max_age=None):
+        """
+        Returns the snapshot of the room if younger than max_age seconds,
+        the TTL by default.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self.lock:
+            snapshot = self.snapshots.get(str(room_id))
+        if snapshot and snapshot.age <= max_age:
+            return snapshot
+        return None
+
+    def set(self, snapshot):
+        with self.lock:
+            if len(self.snapshots) >= self.max_entries:
+                self.snapshots = {
+                    room_id: s for room_id, s in self.snapshots.items()
+                    if s.age <= self.ttl
+                }
+            self.snapshots[snapshot.room_id] = snapshot
+
+    def invalidate(self, room_ids):
+        with self.lock:
+            for room_id in room_ids:
+                self.snapshots.pop(str(room_id), None)
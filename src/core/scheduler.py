@@ -0,0 +1,234 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from utils.logger_manager import logger
+from utils.storage import open_database
+
+
+# polling speeds up to this factor of the interval around usual live hours
+HOT_HOUR_FACTOR = 0.5
+# and slows down to this factor for accounts that keep being offline
+MAX_BACKOFF_FACTOR = 3.0
+# number of consecutive offline checks that add one interval of backoff
+BACKOFF_STEP = 12
+# random spread applied to every delay, as a fraction of it
+JITTER = 0.1
+
+HOURS_PER_WEEK = 7 * 24
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every account of the process.
+    """
+
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, rate, burst=1):
+        with cls._instance_lock:
+            cls._instance = cls(rate, burst)
+        return cls._instance
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(rate=2)
+            return cls._instance
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns how many seconds to wait before using it.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class LiveHistory:
+    """
+    Remembers at which hours of the week each account went live.
+    """
+
+    def __init__(self, path=None):
+        self.lock = threading.Lock()
+        self.conn = open_database(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS live_history ("
+            "username TEXT NOT NULL, "
+            "hour INTEGER NOT NULL, "
+            "count INTEGER NOT NULL, "
+            "PRIMARY KEY (username, hour))"
+        )
+
+    @staticmethod
+    def hour_of_week(timestamp=None) -> int:
+        t = time.localtime(timestamp)
+        return t.tm_wday * 24 + t.tm_hour
+
+    def record_live(self, username, timestamp=None):
+        hour = self.hour_of_week(timestamp)
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO live_history (username, hour, count) "
+                "VALUES (?, ?, 1) ON CONFLICT (username, hour) "
+                "DO UPDATE SET count = count + 1",
+                (username, hour)
+            )
+
+    def is_hot(self, username, timestamp=None) -> bool:
+        """
+        Whether the user went live around this hour in the past weeks.
+        """
+        hour = self.hour_of_week(timestamp)
+        hours = [(hour + d) % HOURS_PER_WEEK for d in (-1, 0, 1)]
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT SUM(count) FROM live_history "
+                "WHERE username = ? AND hour IN (?, ?, ?)",
+                (username, *hours)
+            ).fetchone()
+        return bool(row and row[0])
+
+
+class PollScheduler:
+    """
+    Priority queue of the next check of every account.
+
+    New accounts are spread evenly across the interval; after each check
+    the next one is pushed closer for accounts that usually go live at
+    this time and further away for dormant ones.
+    """
+
+    def __init__(self, interval, history=None):
+        self.interval = interval
+        self.history = history
+        self.queue = []  # (due, seq, user)
+        self.due = {}  # user -> due
+        self.misses = {}  # user -> consecutive offline checks
+        self.intervals = {}  # user -> own interval, if not the default
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self.due)
+
+    def __contains__(self, user):
+        return user in self.due
+
+    def add_all(self, users):
+        """
+        Schedules the first check of the users evenly over one interval.
+        """
+        users = [u for u in users if u not in self.due]
+        step = self.interval / max(len(users), 1)
+        for i, user in enumerate(users):
+            self.schedule(user, i * step)
+
+    def add(self, user, interval=None):
+        """
+        Schedules the first check of a user right away, with its own
+        interval between checks if given.
+        """
+        if interval:
+            self.intervals[user] = interval
+        self.schedule(user, 0)
+
+    def schedule(self, user, delay):
+        due = time.monotonic() + delay
+        self.due[user] = due
+        heapq.heappush(self.queue, (due, next(self.counter), user))
+        self.wakeup.set()
+
+    def remove(self, user):
+        # stale heap entries are skipped when popped
+        self.due.pop(user, None)
+        self.misses.pop(user, None)
+        self.intervals.pop(user, None)
+
+    def next_delay(self, user) -> float:
+        factor = 1 + self.misses.get(user, 0) / BACKOFF_STEP
+        factor = min(factor, MAX_BACKOFF_FACTOR)
+
+        try:
+            if self.history and self.history.is_hot(user):
+                factor = HOT_HOUR_FACTOR
+        except Exception as ex:
+            logger.error(f"Live history unavailable: {ex}")
+
+        delay = self.intervals.get(user, self.interval) * factor
+        return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def live_detected(self, user):
+        """
+        Remembers the hour a live was found at, when it started rather
+        than when the recording ends.
+        """
+        if self.history:
+            self.history.record_live(user)
+
+    def reschedule(self, user, went_live):
+        if went_live:
+            self.misses[user] = 0
+            # check again right after the recording, as automatic mode does
+            self.schedule(user, 0)
+        else:
+            self.misses[user] = self.misses.get(user, 0) + 1
+            self.schedule(user, self.next_delay(user))
+
+    async def next_user(self):
+        """
+        Waits until the next account is due and returns it.
+        The account leaves the queue until it is rescheduled.
+        """
+        while True:
+            while self.queue and \
+                    self.due.get(self.queue[0][2]) != self.queue[0][0]:
+                heapq.heappop(self.queue)  # stale entry
+
+            if not self.queue:
+                timeout = None
+            else:
+                timeout = self.queue[0][0] - time.monotonic()
+                if timeout <= 0:
+                    _, _, user = heapq.heappop(self.queue)
+                    del self.due[user]
+                    return user
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
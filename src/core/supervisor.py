@@ -0,0 +1,393 @@
+import asyncio
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.control import ControlServer
+from core.tiktok_api import TikTokAPI
+from core.post_processor import PostProcessor
+from core.scheduler import PollScheduler, LiveHistory, RateLimiter
+from core.tiktok_recorder import TikTokRecorder
+from utils.logger_manager import logger
+from utils.metrics import MetricsServer
+from utils.custom_exceptions import UserLiveError, LiveNotFound, \
+    TikTokRecorderError
+from utils.enums import Mode, Error, TimeOut, TikTokError
+
+
+# users a daemon can watch, each may hold a thread while recording
+MAX_WATCHED_USERS = 500
+
+
+class LivenessBatcher:
+    """
+    Coalesces the liveness checks issued by concurrent poll tasks into
+    batched check_alive requests.
+    """
+
+    def __init__(self, tiktok, window=0.5):
+        self.tiktok = tiktok
+        self.window = window
+        self.pending = {}  # room_id -> [asyncio.Future]
+        self._flush_task = None
+
+    async def is_alive(self, room_id) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(str(room_id), []).append(future)
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+
+        return await future
+
+    async def _flush(self):
+        # give the other poll tasks of this sweep time to join the batch
+        await asyncio.sleep(self.window)
+        pending, self.pending = self.pending, {}
+        self._flush_task = None
+
+        try:
+            alive = await asyncio.to_thread(
+                self.tiktok.are_rooms_alive, list(pending))
+        except Exception as ex:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(ex)
+            return
+
+        for room_id, futures in pending.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(alive.get(room_id, False))
+
+
+class RecorderSupervisor:
+    """
+    Runs the poll loop and the recording of every watched user as asyncio
+    tasks inside a single process.
+
+    Blocking network and disk work is pushed to a thread pool, so a user
+    that is not live costs an entry in the poll scheduler instead of an
+    OS process.
+
+    With a control port the supervisor runs as a daemon: it keeps going
+    with no users, and users are added and removed while it runs through
+    the local control API.
+    """
+
+    def __init__(
+        self,
+        users,
+        mode,
+        automatic_interval,
+        cookies,
+        proxy,
+        output,
+        duration,
+        use_telegram,
+        live_remux=False,
+        control_port=None,
+    ):
+        self.users = list(users)
+        self.mode = mode
+        self.automatic_interval = automatic_interval
+        self.cookies = cookies
+        self.proxy = proxy
+        self.output = output
+        self.duration = duration
+        self.use_telegram = use_telegram
+        self.live_remux = live_remux
+        self.control_port = control_port
+
+        self.stop_event = threading.Event()
+        # set to stop the recording of a single user when it is removed
+        self.user_stop_events = {user: threading.Event() for user in users}
+        self.tasks = {}  # user -> asyncio.Task
+        self.recording = set()  # users being recorded
+        self.loop = None
+        self.main_task = None
+        self.control = None
+
+    def run(self):
+        """
+        Run the supervisor until every task is done or Ctrl-C is pressed.
+        """
+        # created in this process, resumes the jobs of dead processes
+        PostProcessor.shared()
+
+        try:
+            asyncio.run(self._main())
+        except KeyboardInterrupt:
+            print("\n[!] Ctrl-C detected.", flush=True)
+        except asyncio.CancelledError:
+            logger.info("Recorder stopped.")
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.main_task = asyncio.current_task()
+
+        # every user may hold a thread while recording, threads are only
+        # created when needed
+        watched = MAX_WATCHED_USERS if self.control_port else len(self.users)
+        executor = ThreadPoolExecutor(
+            max_workers=max(watched, 1) + 4,
+            thread_name_prefix="recorder"
+        )
+        loop.set_default_executor(executor)
+
+        if self.control_port:
+            try:
+                loop.add_signal_handler(signal.SIGTERM, self.main_task.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass  # not available on Windows
+
+        try:
+            self.tiktok = await asyncio.to_thread(
+                TikTokAPI, proxy=self.proxy, cookies=self.cookies)
+            # checks are spread over the interval, wait a bit longer
+            # than the default for other polls to share the request
+            self.liveness = LivenessBatcher(self.tiktok, window=2)
+
+            if self.mode == Mode.MANUAL:
+                for user in self.users:
+                    self.tasks[user] = asyncio.create_task(
+                        self._record_once(user), name=user)
+                await asyncio.gather(*self.tasks.values())
+            else:
+                await self._dispatch()
+
+        finally:
+            # running recordings see the event, close their files and return
+            self.stop_event.set()
+            for event in self.user_stop_events.values():
+                event.set()
+            if self.control:
+                self.control.shutdown()
+            executor.shutdown(wait=True)
+
+    async def _dispatch(self):
+        """
+        Starts the check of every account when the scheduler says it is
+        due, within the global rate limit.
+        """
+        self.recorders = {}  # user -> TikTokRecorder
+        self.scheduler = PollScheduler(
+            self.automatic_interval * TimeOut.ONE_MINUTE,
+            history=await asyncio.to_thread(LiveHistory)
+        )
+        self.scheduler.add_all(self.users)
+        rate_limiter = RateLimiter.shared()
+
+        if self.control_port:
+            self.control = ControlServer.start(self, self.control_port)
+
+        while not self.stop_event.is_set():
+            user = await self.scheduler.next_user()
+            await rate_limiter.acquire_async()
+            self.tasks[user] = asyncio.create_task(
+                self._check_user(user), name=user)
+
+    def add_user(self, user, interval=None) -> bool:
+        """
+        Starts watching a user, its first check runs right away.
+        Called from any thread; returns False if already watched.
+        """
+        return self._call_in_loop(self._add_user, user, interval)
+
+    def remove_user(self, user) -> bool:
+        """
+        Stops watching a user; a recording in progress is ended and its
+        file post-processed as usual. Returns False if not watched.
+        """
+        return self._call_in_loop(self._remove_user, user)
+
+    def status(self) -> list:
+        """
+        Returns the state of every watched user.
+        """
+        return self._call_in_loop(self._status)
+
+    def stop(self):
+        """
+        Ends every recording and stops the supervisor, from any thread.
+        """
+        self.loop.call_soon_threadsafe(self.main_task.cancel)
+
+    def _call_in_loop(self, func, *args):
+        # the scheduler belongs to the event loop, run there and wait
+        async def call():
+            return func(*args)
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result()
+
+    def _add_user(self, user, interval):
+        if user in self.user_stop_events:
+            return False
+        if len(self.users) >= MAX_WATCHED_USERS:
+            raise TikTokRecorderError(
+                f"Too many users, at most {MAX_WATCHED_USERS} can be watched.")
+
+        self.users.append(user)
+        self.user_stop_events[user] = threading.Event()
+        self.scheduler.add(
+            user, interval * TimeOut.ONE_MINUTE if interval else None)
+        logger.info(f"Watching @{user}")
+        return True
+
+    def _remove_user(self, user):
+        if user not in self.user_stop_events:
+            return False
+
+        self.users.remove(user)
+        self.user_stop_events.pop(user).set()
+        self.scheduler.remove(user)
+        self.recorders.pop(user, None)
+        logger.info(f"Stopped watching @{user}")
+        return True
+
+    def _status(self):
+        now = time.monotonic()
+        return [
+            {
+                'user': user,
+                'recording': user in self.recording,
+                'next_check': round(max(self.scheduler.due[user] - now, 0))
+                if user in self.scheduler.due else None,
+            }
+            for user in self.users
+        ]
+
+    def _build_recorder(self, user):
+        return TikTokRecorder(
+            url=None,
+            user=user,
+            room_id=None,
+            mode=self.mode,
+            automatic_interval=self.automatic_interval,
+            cookies=self.cookies,
+            proxy=self.proxy,
+            output=self.output,
+            duration=self.duration,
+            use_telegram=self.use_telegram,
+            live_remux=self.live_remux,
+            tiktok=self.tiktok,
+            stop_event=self.user_stop_events[user],
+        )
+
+    async def _poll_once(self, recorder):
+        """
+        Async counterpart of TikTokRecorder.poll_once that shares the
+        liveness check with the other users.
+        """
+        user = recorder.user
+        recorder.room_id = await asyncio.to_thread(
+            self.tiktok.get_room_id_from_user, user)
+
+        if not await self.liveness.is_alive(recorder.room_id):
+            raise UserLiveError(
+                f"@{user}: {TikTokError.USER_NOT_CURRENTLY_LIVE}")
+
+        self.scheduler.live_detected(user)
+        self.recording.add(user)
+        try:
+            await asyncio.to_thread(
+                recorder.start_recording, user, recorder.room_id)
+        finally:
+            self.recording.discard(user)
+
+    async def _record_once(self, user):
+        try:
+            recorder = await asyncio.to_thread(self._build_recorder, user)
+            await asyncio.to_thread(recorder.manual_mode)
+        except Exception as ex:
+            logger.error(ex)
+
+    async def _check_user(self, user):
+        if user not in self.recorders:
+            try:
+                self.recorders[user] = await asyncio.to_thread(
+                    self._build_recorder, user)
+            except Exception as ex:
+                logger.error(f"@{user}: {ex}")
+                self.tasks.pop(user, None)
+                # a daemon outlives network outages, try again later
+                if not self.stop_event.is_set() and \
+                        user in self.user_stop_events:
+                    self.scheduler.schedule(
+                        user, self.scheduler.next_delay(user))
+                return
+
+        went_live = False
+        retry_after = None
+        try:
+            await self._poll_once(self.recorders[user])
+            went_live = True
+
+        except UserLiveError as ex:
+            logger.info(ex)
+
+        except LiveNotFound as ex:
+            logger.error(f"@{user}: live not found: {ex}")
+
+        except ConnectionError:
+            logger.error(Error.CONNECTION_CLOSED_AUTOMATIC)
+            retry_after = TimeOut.CONNECTION_CLOSED * TimeOut.ONE_MINUTE
+
+        except Exception as ex:
+            logger.error(f"@{user}: unexpected error: {ex}\n")
+
+        finally:
+            self.tasks.pop(user, None)
+
+        if self.stop_event.is_set() or user not in self.user_stop_events:
+            return
+
+        if retry_after:
+            self.scheduler.schedule(user, retry_after)
+        else:
+            self.scheduler.reschedule(user, went_live)
+
+
+def _run_supervisor(users, kwargs, index=0, setup=None):
+    if setup:
+        setup()
+    MetricsServer.start(offset=index)
+    RecorderSupervisor(users, **kwargs).run()
+
+
+def run_supervised(users, workers=1, setup=None, **kwargs):
+    """
+    Run the given users under one supervisor, or split them across a
+    pool of `workers` processes, each with its own event loop.
+    `setup` is called first in every worker, to configure its classes.
+    """
+    workers = max(1, min(workers, len(users)))
+    if workers == 1:
+        _run_supervisor(users, kwargs)
+        return
+
+    processes = []
+    for i in range(workers):
+        p = multiprocessing.Process(
+            target=_run_supervisor,
+            args=(users[i::workers], kwargs, i, setup)
+        )
+        p.start()
+        processes.append(p)
+
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        print("\n[!] Ctrl-C detected.", flush=True)
+        try:
+            for p in processes:
+                p.join()
+        except KeyboardInterrupt:
+            print("\n[!] Forcefully terminating all processes.", flush=True)
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
@@ -1,64 +1,154 @@
-import json
 import re
 
-from core.tiktok_waf_solver import WAFSolver
+from core.room_info import RoomSnapshot, RoomInfoCache
+from core.tiktok_waf_solver import WAFSolver, is_waf_challenge
 from http_utils.http_client import HttpClient
 from utils.enums import StatusCode, TikTokError
-from utils.logger_manager import logger
+from utils.metrics import MetricsRegistry
+from utils.room_cache import RoomIdCache
 from utils.custom_exceptions import UserLiveError, TikTokRecorderError, \
     LiveNotFound, IPBlockedByWAF
 
 
+# max number of room ids accepted by a single check_alive request
+CHECK_ALIVE_BATCH_SIZE = 50
+# (connect, read) seconds before a stream edge is given up for another
+STREAM_TIMEOUT = (10, 30)
+
+API_LATENCY = MetricsRegistry.shared().histogram(
+    'tiktok_api_request_seconds',
+    'Duration of the TikTok API calls, cache hits included',
+    labels=('method',)
+)
+
+
 class TikTokAPI:
 
+    BASE_URL = 'https://www.tiktok.com'
+    WEBCAST_URL = 'https://webcast.tiktok.com'
+    API_URL = 'https://www.tiktok.com/api-live/user/room/'
+
+    @classmethod
+    def configure(cls, base_url=None, webcast_url=None):
+        """
+        Points the API at other hosts, such as the local stand-in server
+        of the benchmarks.
+        """
+        if base_url:
+            cls.BASE_URL = base_url.rstrip('/')
+            cls.API_URL = f"{cls.BASE_URL}/api-live/user/room/"
+        if webcast_url:
+            cls.WEBCAST_URL = webcast_url.rstrip('/')
+
     def __init__(self, proxy, cookies):
-        self.BASE_URL = 'https://www.tiktok.com'
-        self.WEBCAST_URL = 'https://webcast.tiktok.com'
-        self.API_URL = 'https://www.tiktok.com/api-live/user/room/'
+        # sessions are shared by every TikTokAPI of the process
+        client = HttpClient.shared(proxy, cookies)
+        self.http_client = client.req
+        self._http_client_stream = client.req_stream
+
+        self.room_cache = RoomIdCache.shared()
+        self.room_info_cache = RoomInfoCache.shared()
+
+    def _get(self, url, **kwargs):
+        """
+        GET through the API session. When the WAF serves its challenge
+        instead of the page, the challenge is solved, its cookie set on
+        the shared session and the request sent again.
+        """
+        response = self.http_client.get(url, **kwargs)
+        if not is_waf_challenge(response):
+            return response
+
+        try:
+            cookie = WAFSolver.solve(response.text)
+        except (ValueError, KeyError):
+            raise IPBlockedByWAF(TikTokError.WAF_BLOCKED)
+        self.http_client.cookies.update(cookie)
 
-        self.http_client = HttpClient(proxy, cookies).req
-        self._http_client_stream = HttpClient(proxy, cookies).req_stream
+        response = self.http_client.get(url, **kwargs)
+        if is_waf_challenge(response):
+            raise IPBlockedByWAF(TikTokError.WAF_BLOCKED)
+        return response
 
     def _is_authenticated(self) -> bool:
-        response = self.http_client.get(f'{self.BASE_URL}/foryou')
+        response = self._get(f'{self.BASE_URL}/foryou')
         response.raise_for_status()
 
         content = response.text
         return 'login-title' not in content
 
+    @API_LATENCY.time(method='is_country_blacklisted')
     def is_country_blacklisted(self) -> bool:
         """
         Checks if the user is in a blacklisted country that requires login
         """
-        response = self.http_client.get(
+        response = self._get(
             f"{self.BASE_URL}/live",
             allow_redirects=False
         )
 
         return response.status_code == StatusCode.REDIRECT
 
-    def is_room_alive(self, room_id: str) -> bool:
+    def is_room_alive(self, room_id: str, max_age=None) -> bool:
         """
         Checking whether the user is live.
         """
         if not room_id:
             raise UserLiveError(TikTokError.USER_NOT_CURRENTLY_LIVE)
 
-        data = self.http_client.get(
-            f"{self.WEBCAST_URL}/webcast/room/check_alive/"
-            f"?aid=1988&region=CH&room_ids={room_id}&user_is_login=true"
-        ).json()
-
-        if 'data' not in data or len(data['data']) == 0:
-            return False
+        # the same response then gives the stream URLs to record
+        alive = self.get_room_info(room_id, max_age).alive
+        if alive is False:
+            # a dead room will never be reused, forget it
+            if self.room_cache:
+                self.room_cache.invalidate_rooms([str(room_id)])
+            self.forget_room(room_id)
+        if alive is not None:
+            return alive
 
-        return data['data'][0].get('alive', False)
+        return self.are_rooms_alive([room_id]).get(str(room_id), False)
 
+    @API_LATENCY.time(method='are_rooms_alive')
+    def are_rooms_alive(self, room_ids) -> dict:
+        """
+        Checks the live status of many rooms at once, splitting them in
+        chunks the check_alive endpoint accepts.
+        Returns a dict of room_id -> alive.
+        """
+        room_ids = list(dict.fromkeys(str(r) for r in room_ids if r))
+        alive = {room_id: False for room_id in room_ids}
+
+        for i in range(0, len(room_ids), CHECK_ALIVE_BATCH_SIZE):
+            chunk = room_ids[i:i + CHECK_ALIVE_BATCH_SIZE]
+            data = self._get(
+                f"{self.WEBCAST_URL}/webcast/room/check_alive/"
+                f"?aid=1988&region=CH&room_ids={','.join(chunk)}"
+                "&user_is_login=true"
+            ).json()
+
+            # entries carry their room id; fall back to request order
+            for index, room in enumerate(data.get('data') or []):
+                room_id = room.get('room_id_str') or room.get('room_id')
+                room_id = str(room_id) if room_id else \
+                    chunk[index] if index < len(chunk) else None
+                if room_id in alive:
+                    alive[room_id] = room.get('alive', False)
+
+        # a dead room will never be reused, forget it
+        dead = [room_id for room_id, is_alive in alive.items() if not is_alive]
+        if self.room_cache:
+            self.room_cache.invalidate_rooms(dead)
+        if self.room_info_cache:
+            self.room_info_cache.invalidate(dead)
+
+        return alive
+
+    @API_LATENCY.time(method='get_sec_uid')
     def get_sec_uid(self):
         """
         Returns the sec_uid of the authenticated user.
         """
-        response = self.http_client.get(
+        response = self._get(
             f"{self.BASE_URL}/foryou"
         )
 
@@ -72,27 +162,14 @@ class TikTokAPI:
         """
         Given a room_id, I get the username
         """
-        data = self.http_client.get(
-            f"{self.WEBCAST_URL}/webcast/room/info/?aid=1988&room_id={room_id}"
-        ).json()
-
-        if 'Follow the creator to watch their LIVE' in json.dumps(data):
-            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE_FOLLOW)
-
-        if 'This account is private' in data:
-            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE)
-
-        display_id = data.get("data", {}).get("owner", {}).get("display_id")
-        if display_id is None:
-            raise TikTokRecorderError(TikTokError.USERNAME_ERROR)
-
-        return display_id
+        return self.get_room_info(room_id).username()
 
+    @API_LATENCY.time(method='get_room_and_user_from_url')
     def get_room_and_user_from_url(self, live_url: str):
         """
         Given a url, get user and room_id.
         """
-        response = self.http_client.get(live_url, allow_redirects=False)
+        response = self._get(live_url, allow_redirects=False)
         content = response.text
 
         if response.status_code == StatusCode.REDIRECT:
@@ -117,11 +194,17 @@ class TikTokAPI:
 
         return user, room_id
 
-    def get_room_id_from_user(self, user: str) -> str:
+    @API_LATENCY.time(method='get_room_id_from_user')
+    def get_room_id_from_user(self, user: str, use_cache=True) -> str:
         """
         Given a username, I get the room_id
         """
-        response = self.http_client.get(self.API_URL, params={
+        if use_cache and self.room_cache:
+            room_id = self.room_cache.get(user)
+            if room_id:
+                return room_id
+
+        response = self._get(self.API_URL, params={
             "uniqueId": user,
             "sourceType": 54,
             "aid": 1988
@@ -136,10 +219,52 @@ class TikTokAPI:
                 data['data'].get('user') and
                 data['data']['user'].get('roomId')):
             room_id = data['data']['user']['roomId']
+            if self.room_cache:
+                self.room_cache.set(user, room_id)
             return room_id
         else:
             raise UserLiveError(TikTokError.ROOM_ID_ERROR)
 
+    @API_LATENCY.time(method='get_followers_page')
+    def get_followers_page(self, sec_uid, cursor=0):
+        """
+        Returns one page of the accounts followed by the user, as
+        (usernames, has_more, next cursor). Newest follows come first.
+        """
+        url = (
+            f"{self.BASE_URL}/api/user/list/"
+            "?WebIdLastTime=1747672102"
+            "&aid=1988&app_language=it-IT&app_name=tiktok_web"
+            "&browser_language=it-IT&browser_name=Mozilla&browser_online=true"
+            "&browser_platform=Linux%20x86_64"
+            "&browser_version=5.0%20%28X11%3B%20Linux%20x86_64%29%20AppleWebKit%2F537.36%20%28KHTML%2C%20like%20Gecko%29%20Chrome%2F136.0.0.0%20Safari%2F537.36"
+            "&channel=tiktok_web&cookie_enabled=true&count=30&data_collection_enabled=true"
+            "&device_id=7506194516308166166&device_platform=web_pc&focus_state=true"
+            "&from_page=user&history_len=2&is_fullscreen=false&is_page_visible=true"
+            f"&maxCursor={cursor}&minCursor={cursor}"
+            "&odinId=7246312836442604570&os=linux&priority_region=IT"
+            "&referer=&region=IT&scene=21&screen_height=1080&screen_width=1920"
+            f"&secUid={sec_uid}&tz_name=Europe%2FRome&user_is_login=true"
+            "&webcast_language=it-IT&msToken=&X-Bogus=&X-Gnarly="
+        )
+
+        response = self._get(url)
+
+        if response.status_code != StatusCode.OK:
+            raise TikTokRecorderError("Failed to retrieve followers list.")
+
+        data = response.json()
+        followers = [
+            user.get('user', {}).get('uniqueId')
+            for user in data.get('userList', [])
+        ]
+
+        return (
+            [username for username in followers if username],
+            data.get('hasMore', False),
+            data.get('minCursor', 0)
+        )
+
     def get_followers_list(self, sec_uid) -> list:
         """
         Returns all followers for the authenticated user by paginating
@@ -149,38 +274,9 @@ class TikTokAPI:
         has_more = True
 
         while has_more:
-            url = (
-                f"{self.BASE_URL}/api/user/list/"
-                "?WebIdLastTime=1747672102"
-                "&aid=1988&app_language=it-IT&app_name=tiktok_web"
-                "&browser_language=it-IT&browser_name=Mozilla&browser_online=true"
-                "&browser_platform=Linux%20x86_64"
-                "&browser_version=5.0%20%28X11%3B%20Linux%20x86_64%29%20AppleWebKit%2F537.36%20%28KHTML%2C%20like%20Gecko%29%20Chrome%2F136.0.0.0%20Safari%2F537.36"
-                "&channel=tiktok_web&cookie_enabled=true&count=30&data_collection_enabled=true"
-                "&device_id=7506194516308166166&device_platform=web_pc&focus_state=true"
-                "&from_page=user&history_len=2&is_fullscreen=false&is_page_visible=true"
-                f"&maxCursor={cursor}&minCursor={cursor}"
-                "&odinId=7246312836442604570&os=linux&priority_region=IT"
-                "&referer=&region=IT&scene=21&screen_height=1080&screen_width=1920"
-                f"&secUid={sec_uid}&tz_name=Europe%2FRome&user_is_login=true"
-                "&webcast_language=it-IT&msToken=&X-Bogus=&X-Gnarly="
-            )
-
-            response = self.http_client.get(url)
-
-            if response.status_code != StatusCode.OK:
-                raise TikTokRecorderError("Failed to retrieve followers list.")
-
-            data = response.json()
-            user_list = data.get('userList', [])
-
-            for user in user_list:
-                username = user.get('user', {}).get('uniqueId')
-                if username:
-                    followers.append(username)
-
-            has_more = data.get('hasMore', False)
-            new_cursor = data.get('minCursor', 0)
+            page, has_more, new_cursor = \
+                self.get_followers_page(sec_uid, cursor)
+            followers.extend(page)
 
             if new_cursor == cursor:
                 break
@@ -196,51 +292,51 @@ class TikTokAPI:
         """
         Return the cdn (flv or m3u8) of the streaming
         """
-        data = self.http_client.get(
+        variants = self.get_live_variants(room_id)
+        return variants[0].url if variants else None
+
+    def get_live_variants(self, room_id: str) -> list:
+        """
+        Returns the FLV variants of the live, sorted from the highest
+        quality level.
+        """
+        return self.get_room_info(room_id).variants()
+
+    @API_LATENCY.time(method='get_room_info')
+    def get_room_info(self, room_id, max_age=None) -> RoomSnapshot:
+        """
+        Returns what room/info tells about the room, reusing a response
+        fetched less than max_age seconds ago (ROOM_INFO_TTL by default).
+        """
+        if self.room_info_cache:
+            snapshot = self.room_info_cache.get(room_id, max_age)
+            if snapshot:
+                return snapshot
+
+        data = self._get(
             f"{self.WEBCAST_URL}/webcast/room/info/?aid=1988&room_id={room_id}"
         ).json()
+        snapshot = RoomSnapshot(room_id, data)
+
+        if self.room_info_cache:
+            self.room_info_cache.set(snapshot)
+        return snapshot
 
-        if 'This account is private' in data:
-            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE)
-
-        stream_url = data.get('data', {}).get('stream_url', {})
-
-        sdk_data_str = stream_url.get('live_core_sdk_data', {}).get('pull_data', {}).get('stream_data')
-        if not sdk_data_str:
-            logger.warning("No SDK stream data found. Falling back to legacy URLs. Consider contacting the developer to update the code.")
-            return (stream_url.get('flv_pull_url', {}).get('FULL_HD1') or
-                    stream_url.get('flv_pull_url', {}).get('HD1') or
-                    stream_url.get('flv_pull_url', {}).get('SD2') or
-                    stream_url.get('flv_pull_url', {}).get('SD1') or
-                    stream_url.get('rtmp_pull_url', ''))
-
-        # Extract stream options
-        sdk_data = json.loads(sdk_data_str).get('data', {})
-        qualities = stream_url.get('live_core_sdk_data', {}).get('pull_data', {}).get('options', {}).get('qualities', [])
-        if not qualities:
-            logger.warning("No qualities found in the stream data. Returning None.")
-            return None
-        level_map = {q['sdk_key']: q['level'] for q in qualities}
-
-        best_level = -1
-        best_flv = None
-        for sdk_key, entry in sdk_data.items():
-            level = level_map.get(sdk_key, -1)
-            stream_main = entry.get('main', {})
-            if level > best_level:
-                best_level = level
-                best_flv = stream_main.get('flv')
-
-        if not best_flv and data.get('status_code') == 4003110:
-            raise UserLiveError(TikTokError.LIVE_RESTRICTION)
-
-        return best_flv
-
-    def download_live_stream(self, live_url: str):
-        """
-        Generator che restituisce lo streaming live per un dato room_id.
-        """
-        stream = self._http_client_stream.get(live_url, stream=True)
-        for chunk in stream.iter_content(chunk_size=4096):
-            if chunk:
-                yield chunk
+    def forget_room(self, room_id):
+        """
+        Drops the cached room/info of a room whose live state changed.
+        """
+        if self.room_info_cache:
+            self.room_info_cache.invalidate([room_id])
+
+    @API_LATENCY.time(method='open_live_stream')
+    def open_live_stream(self, live_url: str):
+        """
+        Opens the live stream and returns the raw binary response,
+        to be read with readinto().
+        """
+        response = self._http_client_stream.get(
+            live_url, stream=True, timeout=STREAM_TIMEOUT)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return response
@@ -1,19 +1,51 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 import time
 from http.client import HTTPException
-from multiprocessing import Process
 
 from requests import RequestException
-
-from core.tiktok_api import TikTokAPI
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+from core.follow_list import FollowList
+from core.edges import EdgeSelector
+from core.post_processor import PostProcessor
+from core.quality import QualityPolicy
+from core.reconnect import ReconnectPolicy
+from core.recording_store import RecordingStore
+from core.scheduler import RateLimiter
+from core.tiktok_api import TikTokAPI, CHECK_ALIVE_BATCH_SIZE
 from utils.logger_manager import logger
-from utils.video_management import VideoManagement
-from upload.telegram import Telegram
+from utils.stream_writer import create_stream_writer
+from utils.segment_writer import SegmentWriter
+from utils.flv import FLV_HEADER_SIZE, FLV_SIGNATURE
+from utils.video_management import LiveRemuxer
+from utils.events import Event, EventEmitter, ProgressReporter
+from utils.metrics import MetricsRegistry
 from utils.custom_exceptions import LiveNotFound, UserLiveError, \
-    TikTokRecorderError
+    TikTokRecorderError, RecordingWriteError
 from utils.enums import Mode, Error, TimeOut, TikTokError
 
 
+# room id lookups and check_alive batches in flight during a followers sweep
+SWEEP_LOOKUPS = 16
+SWEEP_CHECKS = 4
+
+metrics = MetricsRegistry.shared()
+RECORDED_BYTES = metrics.counter(
+    'recorder_received_bytes_total', 'Bytes received from the live streams',
+    labels=('user',))
+ACTIVE_RECORDINGS = metrics.gauge(
+    'recorder_active_recordings', 'Recordings in progress')
+RECONNECTS = metrics.counter(
+    'recorder_reconnects_total', 'Reconnections to the live streams',
+    labels=('user',))
+POLL_TO_RECORD = metrics.histogram(
+    'recorder_poll_to_record_seconds',
+    'Time from the live being detected to the first connection to the stream')
+
+
 class TikTokRecorder:
 
     def __init__(
@@ -28,9 +60,15 @@ class TikTokRecorder:
         output,
         duration,
         use_telegram,
+        live_remux=False,
+        tiktok=None,
+        stop_event=None,
     ):
-        # Setup TikTok API client
-        self.tiktok = TikTokAPI(proxy=proxy, cookies=cookies)
+        # Setup TikTok API client (shared when running under the supervisor)
+        self.tiktok = tiktok or TikTokAPI(proxy=proxy, cookies=cookies)
+
+        # Set by the supervisor to stop polling and recording gracefully
+        self.stop_event = stop_event or threading.Event()
 
         # TikTok Data
         self.url = url
@@ -42,6 +80,7 @@ class TikTokRecorder:
         self.automatic_interval = automatic_interval
         self.duration = duration
         self.output = output
+        self.live_remux = live_remux
 
         # Upload Settings
         self.use_telegram = use_telegram
@@ -73,7 +112,7 @@ class TikTokRecorder:
             logger.info(f"ROOM_ID:  {self.room_id}" + (
                 "\n" if not self.tiktok.is_room_alive(self.room_id) else ""))
 
-        # If proxy is provided, set up the HTTP client without the proxy
+        # If proxy is provided, switch to the shared client without the proxy
         if proxy:
             self.tiktok = TikTokAPI(proxy=None, cookies=cookies)
 
@@ -106,11 +145,17 @@ class TikTokRecorder:
 
         self.start_recording(self.user, self.room_id)
 
+    def poll_once(self):
+        """
+        Refresh the room_id of the user and record if they are live.
+        """
+        self.room_id = self.tiktok.get_room_id_from_user(self.user)
+        self.manual_mode()
+
     def automatic_mode(self):
         while True:
             try:
-                self.room_id = self.tiktok.get_room_id_from_user(self.user)
-                self.manual_mode()
+                self.poll_once()
 
             except UserLiveError as ex:
                 logger.info(ex)
@@ -130,41 +175,28 @@ class TikTokRecorder:
                 logger.error(f"Unexpected error: {ex}\n")
 
     def followers_mode(self):
-        active_recordings = {}  # follower -> Process
+        active_recordings = {}  # follower -> Thread
+        follow_list = FollowList(self.tiktok, self.sec_uid)
+
+        # kept across sweeps, their threads bound the requests in flight
+        lookups = ThreadPoolExecutor(
+            max_workers=SWEEP_LOOKUPS, thread_name_prefix="sweep-lookup")
+        checks = ThreadPoolExecutor(
+            max_workers=SWEEP_CHECKS, thread_name_prefix="sweep-check")
 
         while True:
             try:
-                followers = self.tiktok.get_followers_list(self.sec_uid)
+                followers = follow_list.users()
 
-                for follower in followers:
-                    if follower in active_recordings:
-                        if not active_recordings[follower].is_alive():
-                            logger.info(f'Recording of @{follower} finished.')
-                            del active_recordings[follower]
-                        else:
-                            continue
+                for follower, thread in list(active_recordings.items()):
+                    if not thread.is_alive():
+                        logger.info(f'Recording of @{follower} finished.')
+                        del active_recordings[follower]
 
-                    try:
-                        room_id = self.tiktok.get_room_id_from_user(follower)
-
-                        if not room_id or not self.tiktok.is_room_alive(room_id):
-                            #logger.info(f"@{follower} is not live. Skipping...")
-                            continue
-
-                        logger.info(f"@{follower} is live. Starting recording...")
-
-                        process = Process(
-                            target=self.start_recording,
-                            args=(follower, room_id)
-                        )
-                        process.start()
-                        active_recordings[follower] = process
-
-                        time.sleep(2.5)
-
-                    except Exception as e:
-                        logger.error(f'Error while processing @{follower}: {e}')
-                        continue
+                self._sweep_followers(
+                    [f for f in followers if f not in active_recordings],
+                    active_recordings, lookups, checks
+                )
 
                 print()
                 delay = self.automatic_interval * TimeOut.ONE_MINUTE
@@ -183,14 +215,81 @@ class TikTokRecorder:
             except Exception as ex:
                 logger.error(f"Unexpected error: {ex}\n")
 
+    def _sweep_followers(self, followers, active_recordings, lookups, checks):
+        """
+        Checks the followers as a pipeline: room ids are resolved
+        concurrently, every full batch of resolved rooms is sent to
+        check_alive while the lookups go on, and live followers start
+        recording as soon as their batch answers.
+        """
+        pending = {
+            lookups.submit(self.tiktok.get_room_id_from_user, follower): follower
+            for follower in followers
+        }
+
+        batches = []
+        batch = {}  # follower -> room_id
+        for future in as_completed(pending):
+            follower = pending[future]
+            try:
+                room_id = future.result()
+            except Exception as e:
+                logger.error(f'Error while processing @{follower}: {e}')
+                continue
+
+            if not room_id:
+                continue
+            batch[follower] = room_id
+            if len(batch) == CHECK_ALIVE_BATCH_SIZE:
+                batches.append(checks.submit(
+                    self._dispatch_live, batch, active_recordings))
+                batch = {}
+
+        if batch:
+            batches.append(checks.submit(
+                self._dispatch_live, batch, active_recordings))
+
+        for future in batches:
+            future.result()
+
+    def _dispatch_live(self, room_ids, active_recordings):
+        alive = self.tiktok.are_rooms_alive(room_ids.values())
+
+        for follower, room_id in room_ids.items():
+            if not alive.get(str(room_id)):
+                continue
+
+            logger.info(f"@{follower} is live. Starting recording...")
+
+            thread = threading.Thread(
+                target=self._record_follower,
+                args=(follower, room_id),
+                daemon=True
+            )
+            thread.start()
+            active_recordings[follower] = thread
+
+    def _record_follower(self, follower, room_id):
+        # space out stream starts within the global rate limit, without
+        # holding up the rest of the sweep
+        RateLimiter.shared().acquire()
+        self.start_recording(follower, room_id)
+
     def start_recording(self, user, room_id):
         """
         Start recording live
         """
-        live_url = self.tiktok.get_live_url(room_id)
-        if not live_url:
+        # callers check the room right before recording
+        detected_at = time.perf_counter()
+
+        variants = self.tiktok.get_live_variants(room_id)
+        if not variants:
             raise LiveNotFound(TikTokError.RETRIEVE_LIVE_URL)
 
+        quality = QualityPolicy.shared()
+        variant = quality.choose(user, variants)
+        edges = EdgeSelector(variant.urls, self.tiktok.open_live_stream)
+
         current_date = time.strftime("%Y.%m.%d_%H-%M-%S", time.localtime())
 
         if isinstance(self.output, str) and self.output != '':
@@ -200,64 +299,208 @@ class TikTokRecorder:
                 else:
                     self.output = self.output + "/"
 
-        output = f"{self.output if self.output else ''}TK_{user}_{current_date}_flv.mp4"
+        segmented = SegmentWriter.enabled() and not self.live_remux
+        if self.live_remux:
+            # ffmpeg writes the final MP4 while recording
+            output = f"{self.output if self.output else ''}TK_{user}_{current_date}.mp4"
+            out_file = LiveRemuxer(output)
+        elif segmented:
+            # each part is processed as soon as it is closed
+            output = f"{self.output if self.output else ''}TK_{user}_{current_date}"
+            out_file = nullcontext()
+        else:
+            output = f"{self.output if self.output else ''}TK_{user}_{current_date}_flv.mp4"
+            out_file = open(output, "wb", buffering=0)
 
         if self.duration:
             logger.info(f"Started recording for {self.duration} seconds ")
         else:
             logger.info("Started recording...")
 
-        buffer_size = 512 * 1024 # 512 KB buffer
-        buffer = bytearray()
-
         logger.info("[PRESS CTRL + C ONCE TO STOP]")
-        with open(output, "wb") as out_file:
-            stop_recording = False
-            while not stop_recording:
-                try:
-                    if not self.tiktok.is_room_alive(room_id):
-                        logger.info("User is no longer live. Stopping recording.")
-                        break
-
-                    start_time = time.time()
-                    for chunk in self.tiktok.download_live_stream(live_url):
-                        buffer.extend(chunk)
-                        if len(buffer) >= buffer_size:
-                            out_file.write(buffer)
-                            buffer.clear()
-
-                        elapsed_time = time.time() - start_time
-                        if self.duration and elapsed_time >= self.duration:
-                            stop_recording = True
+        events = EventEmitter.shared()
+        events.emit(Event.RECORDING_STARTED, user=user, room_id=room_id,
+                    file=output, segmented=segmented,
+                    quality=variant.sdk_key)
+
+        recordings = RecordingStore.shared()
+        quality.start(output, variant)
+        ACTIVE_RECORDINGS.inc()
+        try:
+            with out_file:
+                if segmented:
+                    writer = SegmentWriter(
+                        lambda index: self._segment_started(
+                            user, f"{output}_part{index:03d}_flv.mp4"),
+                        lambda path: self._segment_finished(user, path)
+                    )
+                else:
+                    recordings.started(user, output, self.use_telegram)
+                    writer = create_stream_writer(out_file.fileno())
+                reconnect = ReconnectPolicy()
+                start_time = time.time()
+                progress = ProgressReporter(user, output)
+                stop_recording = False
+                while not stop_recording:
+                    try:
+                        self.stop_event.wait(reconnect.delay())
+                        if self.stop_event.is_set():
+                            logger.info("Recording stopped by supervisor.")
                             break
 
-                except ConnectionError:
-                    if self.mode == Mode.AUTOMATIC:
-                        logger.error(Error.CONNECTION_CLOSED_AUTOMATIC)
-                        time.sleep(TimeOut.CONNECTION_CLOSED * TimeOut.ONE_MINUTE)
-
-                except (RequestException,HTTPException):
-                    time.sleep(2)
+                        if reconnect.should_check_liveness():
+                            if not self.tiktok.is_room_alive(room_id, max_age=0):
+                                logger.info("User is no longer live. Stopping recording.")
+                                break
+                            reconnect.on_alive()
+
+                        response = edges.connect()
+                        reconnect.on_connected()
+                        if not writer.bytes_received:
+                            POLL_TO_RECORD.observe(
+                                time.perf_counter() - detected_at)
+                        else:
+                            writer.new_stream()
+                            RECONNECTS.inc(user=user)
+                            events.emit(Event.RECONNECTED, user=user,
+                                        reconnects=reconnect.reconnects)
+                        try:
+                            self._copy_stream(
+                                response.raw, writer, start_time,
+                                # a new connection restarts with its own header
+                                skip_header=writer.bytes_received > 0,
+                                progress=progress,
+                                user=user,
+                                edges=edges
+                            )
+                        finally:
+                            response.close()
+
+                        stop_recording = self.stop_event.is_set() or bool(
+                            self.duration and
+                            time.time() - start_time >= self.duration)
+
+                        # a hedged connection takes over without waiting
+                        if not stop_recording and not edges.hedge_ready():
+                            reconnect.on_disconnected(clean=True)
+
+                    except (ConnectionError, RequestException, HTTPException,
+                            ProtocolError, ReadTimeoutError):
+                        edges.failed()
+                        reconnect.on_disconnected()
+
+                    except RecordingWriteError as ex:
+                        logger.error(ex)
+                        stop_recording = True
+
+                    except KeyboardInterrupt:
+                        logger.info("Recording stopped by user.")
+                        stop_recording = True
+
+                    except Exception as ex:
+                        logger.error(f"Unexpected error: {ex}\n")
+                        stop_recording = True
+
+                    finally:
+                        try:
+                            writer.flush()
+                        except RecordingWriteError as ex:
+                            logger.error(ex)
+                            stop_recording = True
 
-                except KeyboardInterrupt:
-                    logger.info("Recording stopped by user.")
-                    stop_recording = True
+                try:
+                    writer.close()
+                except RecordingWriteError as ex:
+                    logger.error(ex)
+        finally:
+            ACTIVE_RECORDINGS.dec()
+            quality.stop(output)
+            edges.cancel_hedge()
+            # the next poll must not see the live as still running
+            self.tiktok.forget_room(room_id)
+
+        if writer.stalls:
+            logger.warning(
+                f"Disk writes fell behind the stream {writer.stalls} times "
+                f"({writer.stall_seconds:.1f}s), max queue depth "
+                f"{writer.max_queue_depth}. Consider raising -write_queue."
+            )
 
-                except Exception as ex:
-                    logger.error(f"Unexpected error: {ex}\n")
-                    stop_recording = True
+        if reconnect.reconnects:
+            logger.info(
+                f"Reconnected {reconnect.reconnects} times, "
+                f"{reconnect.lost_seconds:.1f}s of live lost"
+            )
 
-                finally:
-                    if buffer:
-                        out_file.write(buffer)
-                        buffer.clear()
-                    out_file.flush()
+        events.emit(
+            Event.RECORDING_FINISHED,
+            user=user,
+            file=output,
+            bytes=writer.bytes_received,
+            duration=round(time.time() - start_time),
+            reconnects=reconnect.reconnects,
+            lost_seconds=round(reconnect.lost_seconds, 1),
+            segments=writer.index if segmented else None,
+        )
+
+        if segmented:
+            logger.info(f"Recording finished: {writer.index} segments\n")
+            return
 
         logger.info(f"Recording finished: {output}\n")
-        VideoManagement.convert_flv_to_mp4(output)
 
-        if self.use_telegram:
-            Telegram().upload(output.replace('_flv.mp4', '.mp4'))
+        # marked finished first, post-processing moves it to later states
+        recordings.finished(output, writer.bytes_received)
+        # convert and upload in the background, back to monitoring now
+        PostProcessor.shared().submit(output, self.use_telegram)
+
+    def _segment_started(self, user, path):
+        RecordingStore.shared().started(user, path, self.use_telegram)
+        return path
+
+    def _segment_finished(self, user, path):
+        logger.info(f"Segment finished: {path}")
+        EventEmitter.shared().emit(
+            Event.SEGMENT_FINISHED, user=user, file=path)
+        RecordingStore.shared().finished(path, os.path.getsize(path))
+        PostProcessor.shared().submit(path, self.use_telegram)
+
+    def _copy_stream(self, raw, writer, start_time, skip_header=False,
+                     progress=None, user=None, edges=None):
+        """
+        Copies the stream to the writer until it ends, the duration is
+        reached, the recording is stopped or a hedged connection to a
+        faster edge is ready.
+        """
+        if skip_header:
+            # keep a single FLV header in the output
+            header = raw.read(FLV_HEADER_SIZE)
+            if not header.startswith(FLV_SIGNATURE):
+                writer.write(header)
+
+        while True:
+            size = writer.read_from(raw)
+            if not size:
+                return
+
+            RECORDED_BYTES.inc(size, user=user)
+            if progress:
+                progress.update(writer.bytes_received)
+                # no row for the base name of a segmented recording
+                RecordingStore.shared().progress(
+                    progress.file, writer.bytes_received)
+                QualityPolicy.shared().update(
+                    progress.file, writer.bytes_received)
+
+            elapsed_time = time.time() - start_time
+            if self.duration and elapsed_time >= self.duration:
+                return
+
+            if self.stop_event.is_set():
+                return
+
+            if edges and edges.should_switch(writer.bytes_received):
+                return
 
     def check_country_blacklisted(self):
         is_blacklisted = self.tiktok.is_country_blacklisted()
@@ -1,11 +1,63 @@
+import os
 import re
 import base64
 import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from hashlib import sha256
 from utils.custom_exceptions import IPBlockedByWAF
+from utils.enums import TikTokError
+from utils.metrics import MetricsRegistry
+
+
+# nonces tried before giving up
+MAX_NONCE = 1000000
+# nonces hashed by each task of the process pool
+NONCE_CHUNK = 50000
+# solved challenges kept, the least recently used are dropped
+SOLVED_MAX = 256
+
+WAF_SOLVE_SECONDS = MetricsRegistry.shared().histogram(
+    'waf_solve_seconds', 'Time spent searching the nonce of WAF challenges')
+
+
+def search_nonce(prefix, expected, start, stop):
+    """
+    Returns the nonce in [start, stop) whose hash with the prefix is the
+    expected digest, or None.
+    """
+    # hash the prefix once and resume from a copy of its state
+    base = sha256(prefix)
+    for i in range(start, stop):
+        h = base.copy()
+        h.update(str(i).encode('utf-8'))
+        if h.digest() == expected:
+            return i
+    return None
+
+
+# marks the proof-of-work page served instead of the requested one
+WAF_CHALLENGE = re.compile(r'<p\s+[^>]*id=["\']wci["\']')
+
+
+def is_waf_challenge(response) -> bool:
+    content_type = response.headers.get('Content-Type') or ''
+    return 'html' in content_type and \
+        WAF_CHALLENGE.search(response.text) is not None
+
 
 class WAFSolver:
 
+    # number of processes used to search the nonce, 1 to stay in-process
+    workers = os.cpu_count() or 1
+
+    _solved = OrderedDict()  # prefix -> nonce, least recently used first
+    _solving = {}  # prefix -> threading.Event
+    _lock = threading.Lock()
+    _pool = None
+
     @staticmethod
     def solve(html_content):
 
@@ -31,15 +83,87 @@ class WAFSolver:
         c = json.loads(base64.b64decode(fix_base64_padding(cs)))
 
         prefix = base64.b64decode(c['v']['a'])
-        expect = base64.b64decode(c['v']['c']).hex()
-
-        for i in range(1000000):
-            tried = sha256(prefix + str(i).encode('utf-8')).hexdigest()
-            if expect == tried:
-                d = base64.b64encode(str(i).encode('utf-8')).decode('utf-8')
-                c['d'] = d
-                result = json.dumps(c)
-                cookie = base64.b64encode(result.encode('utf-8')).decode('utf-8')
-                return {wci: cookie}
-
-        raise IPBlockedByWAF
+        expect = base64.b64decode(c['v']['c'])
+
+        i = WAFSolver.find_nonce(prefix, expect)
+        if i is None:
+            raise IPBlockedByWAF(TikTokError.WAF_BLOCKED)
+
+        d = base64.b64encode(str(i).encode('utf-8')).decode('utf-8')
+        c['d'] = d
+        result = json.dumps(c)
+        cookie = base64.b64encode(result.encode('utf-8')).decode('utf-8')
+        return {wci: cookie}
+
+    @classmethod
+    def find_nonce(cls, prefix, expected):
+        """
+        Returns the nonce of the challenge. Solutions are cached per
+        prefix and concurrent callers with the same prefix wait for the
+        first one instead of searching again.
+        """
+        with cls._lock:
+            if prefix in cls._solved:
+                cls._solved.move_to_end(prefix)
+                return cls._solved[prefix]
+
+            event = cls._solving.get(prefix)
+            owner = event is None
+            if owner:
+                event = cls._solving[prefix] = threading.Event()
+
+        if not owner:
+            event.wait()
+            with cls._lock:
+                return cls._solved.get(prefix)
+
+        try:
+            with WAF_SOLVE_SECONDS.time():
+                nonce = cls._search(prefix, expected)
+            if nonce is not None:
+                with cls._lock:
+                    cls._solved[prefix] = nonce
+                    if len(cls._solved) > SOLVED_MAX:
+                        cls._solved.popitem(last=False)
+            return nonce
+        finally:
+            with cls._lock:
+                del cls._solving[prefix]
+            event.set()
+
+    @classmethod
+    def _get_pool(cls):
+        """
+        Returns the process pool, started on the first challenge and
+        kept for the next ones. Its processes are spawned: forking a
+        recorder that runs many threads could copy a held lock.
+        """
+        with cls._lock:
+            if cls._pool is None:
+                cls._pool = ProcessPoolExecutor(
+                    max_workers=cls.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return cls._pool
+
+    @classmethod
+    def _search(cls, prefix, expected):
+        if cls.workers <= 1:
+            return search_nonce(prefix, expected, 0, MAX_NONCE)
+
+        pending = {
+            cls._get_pool().submit(search_nonce, prefix, expected,
+                                   start, min(start + NONCE_CHUNK, MAX_NONCE))
+            for start in range(0, MAX_NONCE, NONCE_CHUNK)
+        }
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                nonce = future.result()
+                if nonce is not None:
+                    for other in pending:
+                        other.cancel()
+                    return nonce
+
+        return None
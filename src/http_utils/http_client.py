@@ -1,12 +1,42 @@
+import json
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from utils.enums import StatusCode
 from utils.logger_manager import logger
 from utils.utils import is_termux
 
 
+# idle connections the streaming session keeps alive for each host.
+# The session is shared by every recorder of the process using the same
+# proxy and cookies, and concurrent recordings often hit the same CDN
+# edge, so one host pool must fit all of them. This caps the reused
+# connections, not the open ones: more are opened and then discarded.
+STREAM_POOL_SIZE = 64
+# hosts the session keeps a pool for, the least recently used is dropped
+POOL_HOSTS = 32
+
+
 class HttpClient:
 
+    _shared = {}  # (proxy, cookies) -> HttpClient
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, proxy=None, cookies=None):
+        """
+        Returns the process-wide client for this proxy and cookies,
+        creating it on first use so sessions and their connection pools
+        are reused by every recorder of the process.
+        """
+        key = (proxy, json.dumps(cookies, sort_keys=True) if cookies else None)
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(proxy, cookies)
+            return cls._shared[key]
+
     def __init__(self, proxy=None, cookies=None):
         self.req = None
         self.req_stream = requests
@@ -29,12 +59,14 @@ class HttpClient:
         self.configure_session()
 
     def configure_session(self) -> None:
-        self.req_stream = requests.Session()
+        self.req_stream = self._pooled_session(STREAM_POOL_SIZE)
 
         if is_termux():
             self.req = self.req_stream
         else:
             from curl_cffi import Session
+            # curl handles are thread-local, the session can be shared;
+            # impersonating chrome already negotiates HTTP/2
             self.req = Session(impersonate="chrome136")
 
         self.req.headers.update(self.headers)
@@ -46,6 +78,17 @@ class HttpClient:
 
         self.check_proxy()
 
+    @staticmethod
+    def _pooled_session(pool_size) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=POOL_HOSTS,
+            pool_maxsize=pool_size
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
     def check_proxy(self) -> None:
         if self.proxy is None:
             return
@@ -2,17 +2,24 @@ import signal
 import sys
 import os
 import multiprocessing
+from functools import partial
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 def record_user(
     user, url, room_id, mode, interval, proxy, output, duration,
-    use_telegram, cookies
+    use_telegram, cookies, live_remux=False
 ):
+    from core.post_processor import PostProcessor
     from core.tiktok_recorder import TikTokRecorder
     from utils.logger_manager import logger
+    from utils.metrics import MetricsServer
     try:
+        # created in this process, resumes the jobs of dead processes
+        PostProcessor.shared()
+        MetricsServer.start()
+
         # Flush output immediately for web interface
         sys.stdout.flush()
         sys.stderr.flush()
@@ -28,6 +35,7 @@ def record_user(
             output=output,
             duration=duration,
             use_telegram=use_telegram,
+            live_remux=live_remux,
         ).run()
     except Exception as e:
         logger.error(f"{e}")
@@ -35,40 +43,110 @@ def record_user(
         sys.stderr.flush()
 
 
+def configure(args):
+    """
+    Applies the settings of the command line to the classes that read
+    them. Worker processes started by spawn import the modules afresh
+    and call it again.
+    """
+    from core.post_processor import PostProcessor
+    from core.scheduler import RateLimiter
+    from core.follow_list import FollowList
+    from core.quality import QualityPolicy
+    from core.edges import EdgeSelector
+    from utils.stream_writer import ThreadedStreamWriter, KB, MB
+    from utils.segment_writer import SegmentWriter
+    from utils.enums import TimeOut
+    from utils.events import EventEmitter
+    from utils.metrics import MetricsServer
+
+    # worker pools converting and uploading finished recordings
+    PostProcessor.configure(
+        convert_workers=args.convert_workers,
+        upload_workers=args.upload_workers
+    )
+
+    # share one rate limit among every watched user
+    RateLimiter.configure(rate=args.poll_rate)
+
+    # quality of the recorded streams within the download budget
+    QualityPolicy.configure(
+        max_quality=args.max_quality,
+        user_qualities=args.user_quality,
+        bandwidth=args.bandwidth * 1e6 if args.bandwidth else None
+    )
+
+    # second connection on a backup edge when a stream slows down
+    EdgeSelector.configure(
+        hedge_below=args.hedge_below * 1000 if args.hedge_below else None)
+
+    # followers mode sweeps a stored list refreshed on its own
+    FollowList.configure(
+        refresh_interval=args.followers_refresh * TimeOut.ONE_MINUTE)
+
+    # buffer sizes and disk queue of the stream writer of every recording
+    ThreadedStreamWriter.configure(
+        chunk_size=args.chunk_size * KB,
+        flush_size=args.flush_size * KB,
+        high_water_mark=args.write_queue
+    )
+
+    # machine-readable events for the process supervising us
+    EventEmitter.configure(
+        fd=args.events_fd,
+        socket_path=args.events_socket
+    )
+
+    # started by the processes that record
+    MetricsServer.configure(port=args.metrics_port)
+
+    # rotate the output into parts while recording
+    SegmentWriter.configure(
+        max_size=args.segment_size * MB,
+        max_duration=args.segment_time * TimeOut.ONE_MINUTE
+    )
+
+
 def run_recordings(args, mode, cookies):
-    if isinstance(args.user, list):
-        processes = []
-        for user in args.user:
-            p = multiprocessing.Process(
-                target=record_user,
-                args=(
-                    user,
-                    args.url,
-                    args.room_id,
-                    mode,
-                    args.automatic_interval,
-                    args.proxy,
-                    args.output,
-                    args.duration,
-                    args.telegram,
-                    cookies
-                )
-            )
-            p.start()
-            processes.append(p)
-        try:
-            for p in processes:
-                p.join()
-        except KeyboardInterrupt:
-            print("\n[!] Ctrl-C detected.", flush=True)
-            try:
-                for p in processes:
-                    p.join()
-            except KeyboardInterrupt:
-                print("\n[!] Forcefully terminating all processes.", flush=True)
-                for p in processes:
-                    if p.is_alive():
-                        p.terminate()
+    from utils.enums import Mode
+
+    if args.control_port is not None:
+        # daemon: more users are added through the control API
+        users = args.user if isinstance(args.user, list) else \
+            [args.user] if args.user else []
+        from core.supervisor import run_supervised
+        run_supervised(
+            users,
+            mode=mode,
+            automatic_interval=args.automatic_interval,
+            cookies=cookies,
+            proxy=args.proxy,
+            output=args.output,
+            duration=args.duration,
+            use_telegram=args.telegram,
+            live_remux=args.live_remux,
+            control_port=args.control_port,
+        )
+    elif isinstance(args.user, list) or (
+            mode == Mode.AUTOMATIC and args.user and
+            not args.url and not args.room_id):
+        # a single watched user also gets the adaptive poll schedule
+        users = args.user if isinstance(args.user, list) else [args.user]
+        from core.supervisor import run_supervised
+        run_supervised(
+            users,
+            workers=args.workers,
+            # spawned workers start with the defaults of every class
+            setup=partial(configure, args),
+            mode=mode,
+            automatic_interval=args.automatic_interval,
+            cookies=cookies,
+            proxy=args.proxy,
+            output=args.output,
+            duration=args.duration,
+            use_telegram=args.telegram,
+            live_remux=args.live_remux,
+        )
     else:
         record_user(
             args.user,
@@ -80,7 +158,8 @@ def run_recordings(args, mode, cookies):
             args.output,
             args.duration,
             args.telegram,
-            cookies
+            cookies,
+            args.live_remux
         )
 
 
@@ -107,6 +186,8 @@ def main():
         # read cookies from the config file
         cookies = read_cookies()
 
+        configure(args)
+
         # run the recordings based on the parsed arguments
         run_recordings(args, mode, cookies)
 
@@ -1,19 +1,69 @@
+import asyncio
+import math
+import os
+import threading
+import time
 from pathlib import Path
 
-from pyrogram import Client
+from pyrogram import Client, raw, utils
 from pyrogram.enums import ParseMode
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
 
+from utils.events import Event, EventEmitter
 from utils.logger_manager import logger
+from utils.metrics import MetricsRegistry
+from utils.storage import open_database
 from utils.utils import read_telegram_config
+from utils.video_management import VideoManagement
 
 
 FREE_USER_MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024
 PREMIUM_USER_MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024
 
+# size of the parts of a file, fixed by Telegram for big files
+PART_SIZE = 512 * 1024
+# files up to this size are sent with a single send_document
+SMALL_FILE_SIZE = 10 * 1024 * 1024
+# media connections used by a big upload and parts in flight on each
+UPLOAD_SESSIONS = 3
+UPLOADS_PER_SESSION = 4
+PART_RETRIES = 3
+
+UPLOADED_BYTES = MetricsRegistry.shared().counter(
+    'telegram_uploaded_bytes_total', 'Bytes of the files sent to Telegram')
+UPLOAD_SECONDS = MetricsRegistry.shared().histogram(
+    'telegram_upload_seconds', 'Duration of the uploads of single files')
+
+CAPTION = (
+    '🎥 <b>Video recorded via <a href="https://github.com/Michele0303/tiktok-live-recorder">'
+    'TikTok Live Recorder</a></b>'
+)
+
 
 class Telegram:
+    """
+    Telegram client of the process, started once and used by every upload.
+
+    Pyrogram runs on an event loop in its own thread and uploads from any
+    thread are handed to it. Big files are sent in parts over several
+    media connections at once; the parts already sent are stored in the
+    local database, so an upload interrupted by a restart continues where
+    it stopped. Files over the size limit of the account are split into
+    numbered parts instead of being skipped.
+    """
 
-    def __init__(self):
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, path=None):
         config = read_telegram_config()
 
         self.api_id = config["api_id"]
@@ -21,25 +71,55 @@ class Telegram:
         self.bot_token = config["bot_token"]
         self.chat_id = config["chat_id"]
 
+        self.lock = threading.Lock()
+        self.conn = open_database(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS upload_progress ("
+            "file TEXT PRIMARY KEY, "
+            "size INTEGER NOT NULL, "
+            "file_id INTEGER NOT NULL, "
+            "next_part INTEGER NOT NULL, "
+            "sent INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="telegram", daemon=True)
+        self.thread.start()
+
+        self.app = None
+        self.is_premium = False
+        try:
+            self._run(self._start())
+        except Exception:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            raise
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _start(self):
+        # created here so the client binds to the loop of this thread
         self.app = Client(
             'telegram_session',
             api_id=self.api_id,
             api_hash=self.api_hash,
             bot_token=self.bot_token
         )
+        await self.app.start()
+
+        me = await self.app.get_me()
+        self.is_premium = bool(me.is_premium)
 
-    def upload(self, file_path: str):
+    def upload(self, file_path: str) -> bool:
         """
         Upload a file to the bot's own chat (saved messages).
         """
         try:
-            self.app.start()
-
-            me = self.app.get_me()
-            is_premium = me.is_premium
             max_size = (
                 PREMIUM_USER_MAX_FILE_SIZE
-                if is_premium else FREE_USER_MAX_FILE_SIZE
+                if self.is_premium else FREE_USER_MAX_FILE_SIZE
             )
 
             file_size = Path(file_path).stat().st_size
@@ -47,25 +127,213 @@ class Telegram:
                         f"({round(file_size / (1024 * 1024))} MB)")
 
             if file_size > max_size:
-                logger.warning("The file is too large to be "
-                               "uploaded with this type of account.")
-                return
+                logger.info("The file is too large for this type of "
+                            "account, splitting it into parts...")
+                parts = VideoManagement.split_video(file_path, max_size)
+            else:
+                parts = [file_path]
 
             logger.info(f"Uploading video on Telegram... This may take a while depending on the file size.")
-            self.app.send_document(
+            for index, part in enumerate(parts, 1):
+                caption = CAPTION
+                if len(parts) > 1:
+                    caption += f"\nPart {index}/{len(parts)}"
+
+                if not self._is_sent(part):
+                    with UPLOAD_SECONDS.time():
+                        self._run(self._send(part, caption))
+                    UPLOADED_BYTES.inc(os.path.getsize(part))
+
+                if part != file_path:
+                    os.remove(part)
+
+            self._forget(parts)
+            logger.info("File successfully uploaded to Telegram.\n")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error during Telegram upload: {e}\n")
+            return False
+
+    async def _send(self, file_path, caption):
+        if os.path.getsize(file_path) <= SMALL_FILE_SIZE:
+            await self.app.send_document(
                 chat_id=self.chat_id,
                 document=file_path,
-                caption=(
-                    '🎥 <b>Video recorded via <a href="https://github.com/Michele0303/tiktok-live-recorder">'
-                    'TikTok Live Recorder</a></b>'
-                ),
+                caption=caption,
                 parse_mode=ParseMode.HTML,
                 force_document=True,
             )
-            logger.info("File successfully uploaded to Telegram.\n")
+            return
 
-        except Exception as e:
-            logger.error(f"Error during Telegram upload: {e}\n")
+        input_file = await self._save_big_file(file_path)
+        name = os.path.basename(file_path)
+        try:
+            await self.app.invoke(
+                raw.functions.messages.SendMedia(
+                    peer=await self.app.resolve_peer(self.chat_id),
+                    media=raw.types.InputMediaUploadedDocument(
+                        file=input_file,
+                        mime_type='video/mp4',
+                        attributes=[
+                            raw.types.DocumentAttributeFilename(file_name=name)
+                        ],
+                        force_file=True,
+                    ),
+                    random_id=self.app.rnd_id(),
+                    **await utils.parse_text_entities(
+                        self.app, caption, ParseMode.HTML, None)
+                )
+            )
+        except Exception:
+            # the parts may have expired on Telegram, start over next time
+            self._forget([file_path])
+            raise
 
+        self._set_progress(file_path, sent=True)
+
+    async def _save_big_file(self, file_path):
+        """
+        Sends the parts of the file not sent yet, several at a time.
+        """
+        size = os.path.getsize(file_path)
+        total_parts = math.ceil(size / PART_SIZE)
+        file_id, next_part = self._load_progress(file_path, size)
+        if next_part:
+            logger.info(f"Resuming upload at "
+                        f"{next_part * 100 // total_parts}%")
+
+        pending = iter(range(next_part, total_parts))
+        done = set()
+        events = EventEmitter.shared()
+        loop = asyncio.get_running_loop()
+
+        def read_part(f, part):
+            f.seek(part * PART_SIZE)
+            return f.read(PART_SIZE)
+
+        async def worker(session):
+            nonlocal next_part
+            with open(file_path, 'rb') as f:
+                for part in pending:
+                    # off the event loop, the other workers keep sending
+                    chunk = await loop.run_in_executor(None, read_part, f, part)
+                    await self._save_part(
+                        session, file_id, part, total_parts, chunk)
+
+                    # parts end out of order, store the first one missing
+                    done.add(part)
+                    percent = next_part * 100 // total_parts
+                    while next_part in done:
+                        done.remove(next_part)
+                        next_part += 1
+                    self._set_progress(file_path, next_part=next_part)
+
+                    if next_part * 100 // total_parts > percent:
+                        events.emit(
+                            Event.UPLOAD_PROGRESS,
+                            file=file_path,
+                            bytes=min(next_part * PART_SIZE, size),
+                            total=size,
+                        )
+
+        sessions = [
+            Session(
+                self.app, await self.app.storage.dc_id(),
+                await self.app.storage.auth_key(),
+                await self.app.storage.test_mode(), is_media=True
+            ) for _ in range(UPLOAD_SESSIONS)
+        ]
+        try:
+            for session in sessions:
+                await session.start()
+
+            await asyncio.gather(*(
+                worker(session)
+                for session in sessions
+                for _ in range(UPLOADS_PER_SESSION)
+            ))
         finally:
-            self.app.stop()
+            for session in sessions:
+                await session.stop()
+
+        return raw.types.InputFileBig(
+            id=file_id,
+            parts=total_parts,
+            name=os.path.basename(file_path)
+        )
+
+    @staticmethod
+    async def _save_part(session, file_id, part, total_parts, chunk):
+        for attempt in range(PART_RETRIES):
+            try:
+                await session.invoke(
+                    raw.functions.upload.SaveBigFilePart(
+                        file_id=file_id,
+                        file_part=part,
+                        file_total_parts=total_parts,
+                        bytes=chunk
+                    )
+                )
+                return
+
+            except FloodWait as ex:
+                await asyncio.sleep(ex.value)
+
+            except Exception:
+                if attempt == PART_RETRIES - 1:
+                    raise
+
+        raise TimeoutError(f"Part {part} of the file was not accepted")
+
+    def _load_progress(self, file_path, size):
+        """
+        Returns the file_id and the first missing part of an upload,
+        starting a new one if the file is unknown or changed.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, file_id, next_part FROM upload_progress "
+                "WHERE file = ?", (file_path,)
+            ).fetchone()
+
+            if row and row[0] == size:
+                return row[1], row[2]
+
+            file_id = self.app.rnd_id()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO upload_progress (file, size, "
+                "file_id, next_part, sent, updated_at) "
+                "VALUES (?, ?, ?, 0, 0, ?)",
+                (file_path, size, file_id, time.time())
+            )
+            return file_id, 0
+
+    def _set_progress(self, file_path, next_part=None, sent=False):
+        with self.lock:
+            if sent:
+                self.conn.execute(
+                    "UPDATE upload_progress SET sent = 1, updated_at = ? "
+                    "WHERE file = ?", (time.time(), file_path)
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE upload_progress SET next_part = ?, "
+                    "updated_at = ? WHERE file = ?",
+                    (next_part, time.time(), file_path)
+                )
+
+    def _is_sent(self, file_path) -> bool:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, sent FROM upload_progress WHERE file = ?",
+                (file_path,)
+            ).fetchone()
+        return bool(row and row[1] and row[0] == os.path.getsize(file_path))
+
+    def _forget(self, files):
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM upload_progress WHERE file = ?",
+                [(file,) for file in files]
+            )
@@ -1,6 +1,7 @@
 import argparse
 import re
 
+from core.quality import QUALITY_ORDER
 from utils.custom_exceptions import ArgsParseError
 from utils.enums import Mode, Regex
 
@@ -58,6 +59,30 @@ def parse_args():
     )
 
 
+    parser.add_argument(
+        "-poll_rate",
+        dest="poll_rate",
+        help=(
+            "Maximum number of live checks per second across all users.\n"
+            "Checks are spread evenly over the interval. [Default: 2]"
+        ),
+        type=float,
+        default=2,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-followers_refresh",
+        dest="followers_refresh",
+        help=(
+            "Minutes between two refreshes of the stored list of followed\n"
+            "accounts in followers mode. [Default: 30]"
+        ),
+        type=int,
+        default=30,
+        action='store'
+    )
+
     parser.add_argument(
         "-proxy",
         dest="proxy",
@@ -86,6 +111,66 @@ def parse_args():
         action='store'
     )
 
+    parser.add_argument(
+        "-chunk_size",
+        dest="chunk_size",
+        help="Size in KB of each read from the live stream. [Default: 64]",
+        type=int,
+        default=64,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-flush_size",
+        dest="flush_size",
+        help="Size in KB of the buffer written to disk at once. [Default: 1024]",
+        type=int,
+        default=1024,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-write_queue",
+        dest="write_queue",
+        help=(
+            "Number of buffers that can wait for the disk before the stream\n"
+            "reader slows down. 0 writes from the reader thread. [Default: 4]"
+        ),
+        type=int,
+        default=4,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-live_remux",
+        dest="live_remux",
+        action="store_true",
+        help="Remux the stream to fragmented MP4 with ffmpeg while recording,\n"
+             "instead of converting the FLV file once the live ends.",
+    )
+
+    parser.add_argument(
+        "-segment_size",
+        dest="segment_size",
+        help=(
+            "Split the recording into parts of this many MB, each one converted\n"
+            "and uploaded while the live goes on. Keep it under the Telegram\n"
+            "upload limit (2 GB, 4 GB with premium). 0 disables it. [Default: 0]"
+        ),
+        type=int,
+        default=0,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-segment_time",
+        dest="segment_time",
+        help="Split the recording into parts of this many minutes. 0 disables it. [Default: 0]",
+        type=int,
+        default=0,
+        action='store'
+    )
+
     parser.add_argument(
         "-telegram",
         dest="telegram",
@@ -94,6 +179,129 @@ def parse_args():
              "of the recording.\nRequires configuring the telegram.json file",
     )
 
+    parser.add_argument(
+        "-workers",
+        dest="workers",
+        help=(
+            "Number of worker processes used when recording multiple users.\n"
+            "All users of a worker share one event loop. [Default: 1]"
+        ),
+        type=int,
+        default=1,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-convert_workers",
+        dest="convert_workers",
+        help="Number of recordings converted to MP4 at the same time. [Default: 1]",
+        type=int,
+        default=1,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-upload_workers",
+        dest="upload_workers",
+        help="Number of recordings uploaded to Telegram at the same time. [Default: 1]",
+        type=int,
+        default=1,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-events_fd",
+        dest="events_fd",
+        help=(
+            "Write recorder events as newline-delimited JSON to this file\n"
+            "descriptor, opened by the parent process. [Default: None]"
+        ),
+        type=int,
+        default=None,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-events_socket",
+        dest="events_socket",
+        help="Send recorder events as newline-delimited JSON to this Unix socket. [Default: None]",
+        type=str,
+        default=None,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-max_quality",
+        dest="max_quality",
+        help=(
+            "Highest stream quality recorded: ld, sd, hd, uhd or origin.\n"
+            "[Default: the best available]"
+        ),
+        type=str,
+        default=None,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-user_quality",
+        dest="user_quality",
+        help=(
+            "Highest quality per user, overriding -max_quality,\n"
+            "e.g. user1=hd,user2=sd. [Default: None]"
+        ),
+        type=str,
+        default=None,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-bandwidth",
+        dest="bandwidth",
+        help=(
+            "Download budget in Mbps shared by the recordings of a process.\n"
+            "Lower qualities are picked when it is nearly used. [Default: None]"
+        ),
+        type=float,
+        default=None,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-hedge_below",
+        dest="hedge_below",
+        help=(
+            "Open a second connection on a backup edge when a stream runs\n"
+            "below this many kbps, and switch to it if it answers. [Default: None]"
+        ),
+        type=int,
+        default=None,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-control_port",
+        dest="control_port",
+        help=(
+            "Run as a daemon taking users to watch from a local HTTP API on\n"
+            "http://127.0.0.1:<port>. Automatic mode only. [Default: None]"
+        ),
+        type=int,
+        default=None,
+        action='store'
+    )
+
+    parser.add_argument(
+        "-metrics_port",
+        dest="metrics_port",
+        help=(
+            "Serve Prometheus metrics on http://127.0.0.1:<port>/metrics.\n"
+            "With -workers, worker N listens on port + N. [Default: None]"
+        ),
+        type=int,
+        default=None,
+        action='store'
+    )
+
     parser.add_argument(
         "-no-update-check",
         dest="update_check",
@@ -117,7 +325,7 @@ def validate_and_parse_args():
     if args.mode not in ["manual", "automatic", "followers"]:
         raise ArgsParseError("Incorrect mode value. Choose between 'manual', 'automatic' or 'followers'.")
 
-    if args.mode in ["manual", "automatic"]:
+    if args.mode in ["manual", "automatic"] and args.control_port is None:
         if not args.user and not args.room_id and not args.url:
             raise ArgsParseError("Missing URL, username, or room ID. Please provide one of these parameters.")
 
@@ -145,6 +353,68 @@ def validate_and_parse_args():
     if args.automatic_interval < 1:
         raise ArgsParseError("Incorrect automatic_interval value. Must be one minute or more.")
 
+    if args.followers_refresh < 1:
+        raise ArgsParseError("Incorrect followers_refresh value. Must be one minute or more.")
+
+    if args.chunk_size < 1 or args.flush_size < 1:
+        raise ArgsParseError("Incorrect chunk_size or flush_size value. Must be one KB or more.")
+
+    if args.write_queue < 0:
+        raise ArgsParseError("Incorrect write_queue value. Must be zero or more.")
+
+    if args.segment_size < 0 or args.segment_time < 0:
+        raise ArgsParseError("Incorrect segment_size or segment_time value. Must be zero or more.")
+
+    if args.live_remux and (args.segment_size or args.segment_time):
+        raise ArgsParseError("Segmented recording can't be used with live_remux.")
+
+    if args.events_fd is not None and args.events_socket:
+        raise ArgsParseError("Please provide only one among events_fd or events_socket.")
+
+    if args.events_fd is not None and args.events_fd < 0:
+        raise ArgsParseError("Incorrect events_fd value. Must be zero or more.")
+
+    if args.max_quality and args.max_quality not in QUALITY_ORDER:
+        raise ArgsParseError(f"Incorrect max_quality value. Choose between {', '.join(QUALITY_ORDER)}.")
+
+    user_qualities = {}
+    for entry in (args.user_quality or '').split(','):
+        if not entry.strip():
+            continue
+        user, _, quality = entry.partition('=')
+        if quality.strip() not in QUALITY_ORDER:
+            raise ArgsParseError(f"Incorrect user_quality value for '{entry}'. Use user=quality with one of {', '.join(QUALITY_ORDER)}.")
+        user_qualities[user.lstrip('@').strip()] = quality.strip()
+    args.user_quality = user_qualities
+
+    if args.bandwidth is not None and args.bandwidth <= 0:
+        raise ArgsParseError("Incorrect bandwidth value. Must be greater than zero.")
+
+    if args.hedge_below is not None and args.hedge_below <= 0:
+        raise ArgsParseError("Incorrect hedge_below value. Must be greater than zero.")
+
+    if args.control_port is not None:
+        if not 0 < args.control_port < 65536:
+            raise ArgsParseError("Incorrect control_port value. Must be between 1 and 65535.")
+        if args.mode != "automatic":
+            raise ArgsParseError("The control API is only available in automatic mode.")
+        if args.room_id or args.url:
+            raise ArgsParseError("With control_port, watched users are given by username only.")
+        if args.workers > 1:
+            raise ArgsParseError("With control_port, every user runs in one process: do not use workers.")
+
+    if args.metrics_port is not None and not 0 < args.metrics_port < 65536:
+        raise ArgsParseError("Incorrect metrics_port value. Must be between 1 and 65535.")
+
+    if args.poll_rate <= 0:
+        raise ArgsParseError("Incorrect poll_rate value. Must be greater than zero.")
+
+    if args.convert_workers < 1 or args.upload_workers < 1:
+        raise ArgsParseError("Incorrect convert_workers or upload_workers value. Must be one or more.")
+
+    if args.workers < 1:
+        raise ArgsParseError("Incorrect workers value. Must be one or more.")
+
     if args.mode == "manual":
         mode = Mode.MANUAL
     elif args.mode == "automatic":
@@ -28,3 +28,8 @@ class ArgsParseError(TikTokRecorderError):
 class NetworkError(TikTokRecorderError):
     """Raised for network-related errors."""
     pass
+
+
+class RecordingWriteError(TikTokRecorderError):
+    """Raised when the recording can't be written to its output."""
+    pass
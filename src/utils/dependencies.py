@@ -1,23 +1,31 @@
+import importlib.util
+import json
+import os
+import shutil
 import subprocess
 import sys
 import platform
+import sqlite3
+import time
 from subprocess import SubprocessError
 
 from .logger_manager import logger
+from .storage import open_database
 from .utils import is_linux
 
 
+REQUIRED_LIBRARIES = (
+    "distro", "ffmpeg", "curl_cffi", "requests", "pyrogram",
+)
+REQUIREMENTS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "requirements.txt")
+
+
 def check_ffmpeg_binary():
-    try:
-        subprocess.run(
-            ["ffmpeg"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.STDOUT,
-        )
-        return True
-    except FileNotFoundError:
+    if shutil.which("ffmpeg") is None:
         logger.error("FFmpeg binary is not installed")
         return False
+    return True
 
 
 def install_ffmpeg_binary():
@@ -53,56 +61,16 @@ def install_ffmpeg_binary():
     exit(1)
 
 
-def check_distro_library():
-    try:
-        import distro
-        return True
-    except ModuleNotFoundError:
-        return False
-
-
-def check_ffmpeg_library():
-    try:
-        import ffmpeg
-        return True
-    except ModuleNotFoundError:
-        return False
-
-
-def check_argparse_library():
-    try:
-        import argparse
-        return True
-    except ModuleNotFoundError:
-        return False
-
-
-def check_curl_cffi_library():
-    try:
+def check_library(module) -> bool:
+    """
+    Checks that a library is installed without importing it.
+    """
+    if module == "curl_cffi":
         from .utils import is_termux
         if is_termux():
             return True
 
-        import curl_cffi
-        return True
-    except ModuleNotFoundError:
-        return False
-
-
-def check_requests_library():
-    try:
-        import requests
-        return True
-    except ModuleNotFoundError:
-        return False
-
-
-def check_pyrogram_library():
-    try:
-        import pyrogram
-        return True
-    except ModuleNotFoundError:
-        return False
+    return importlib.util.find_spec(module) is not None
 
 
 def install_requirements():
@@ -124,19 +92,85 @@ def install_requirements():
         exit(1)
 
 
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+def dependencies_key() -> str:
+    """
+    Identifies the environment the dependencies were checked in: a new
+    interpreter, an updated requirements file or a reinstalled ffmpeg
+    makes the previous check stale.
+    """
+    ffmpeg_path = shutil.which("ffmpeg")
+    return json.dumps([
+        sys.executable,
+        sys.version,
+        file_mtime(os.path.realpath(sys.executable)),
+        file_mtime(REQUIREMENTS_FILE),
+        ffmpeg_path,
+        file_mtime(ffmpeg_path),
+    ])
+
+
+def dependencies_checked(key) -> bool:
+    """
+    Whether the dependencies were checked in this environment, False
+    when the database can't be read.
+    """
+    try:
+        conn = open_database()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS dependency_check ("
+                "key TEXT PRIMARY KEY, "
+                "checked_at REAL NOT NULL)"
+            )
+            row = conn.execute(
+                "SELECT 1 FROM dependency_check WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError) as ex:
+        logger.debug(f"Dependency check cache not available: {ex}")
+        return False
+    return row is not None
+
+
+def save_dependencies_check(key):
+    try:
+        conn = open_database()
+        try:
+            # entries of other interpreters stay, each keeps its own
+            conn.execute(
+                "INSERT OR REPLACE INTO dependency_check (key, checked_at) "
+                "VALUES (?, ?)", (key, time.time())
+            )
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError) as ex:
+        logger.debug(f"Dependency check not cached: {ex}")
+
+
 def check_and_install_dependencies():
-    dependencies = [
-        check_distro_library(),
-        check_ffmpeg_library(),
-        check_argparse_library(),
-        check_curl_cffi_library(),
-        check_requests_library(),
-        check_pyrogram_library(),
-        check_ffmpeg_binary(),
-    ]
-
-    if False in dependencies:
+    """
+    Checks the libraries and the ffmpeg binary, installing what is
+    missing. The result is stored per environment, so later launches
+    with the same interpreter and ffmpeg skip the check. Without a
+    usable database the check runs every time.
+    """
+    key = dependencies_key()
+    if dependencies_checked(key):
+        return
+
+    if not all(check_library(module) for module in REQUIRED_LIBRARIES):
         install_requirements()
+        importlib.invalidate_caches()
 
     if not check_ffmpeg_binary():
-        install_ffmpeg_binary()
\ No newline at end of file
+        install_ffmpeg_binary()
+
+    save_dependencies_check(key)
@@ -20,6 +20,7 @@ class TimeOut(IntEnum):
     ONE_MINUTE = 60
     AUTOMATIC_MODE = 5
     CONNECTION_CLOSED = 2
+    ROOM_ID_CACHE = 30
 
 
 class StatusCode(IntEnum):
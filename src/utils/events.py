@@ -0,0 +1,150 @@
+import json
+import os
+import socket
+import threading
+import time
+
+from utils.logger_manager import logger
+
+
+# bumped on incompatible changes of the event fields
+EVENTS_VERSION = 1
+
+# seconds between two progress events of a recording
+PROGRESS_INTERVAL = 5
+# seconds before connecting again to a socket that went away
+RECONNECT_INTERVAL = 5
+
+
+class Event:
+    RECORDING_STARTED = 'recording_started'
+    RECORDING_PROGRESS = 'recording_progress'
+    RECONNECTED = 'reconnected'
+    SEGMENT_FINISHED = 'segment_finished'
+    RECORDING_FINISHED = 'recording_finished'
+    CONVERSION_FINISHED = 'conversion_finished'
+    CONVERSION_FAILED = 'conversion_failed'
+    UPLOAD_PROGRESS = 'upload_progress'
+    UPLOAD_FINISHED = 'upload_finished'
+    UPLOAD_FAILED = 'upload_failed'
+
+
+class EventEmitter:
+    """
+    Writes the state changes of the recorder as newline-delimited JSON to
+    a file descriptor or a Unix socket, so a supervisor can follow them
+    without parsing the logs.
+
+    Every line has the fields v (format version), event, time and pid,
+    followed by the fields of the event.
+    """
+
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    fd = None
+    socket_path = None
+
+    @classmethod
+    def configure(cls, fd=None, socket_path=None):
+        cls.fd = fd
+        cls.socket_path = socket_path
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.disabled = self.fd is None and not self.socket_path
+
+        self.sock = None
+        self.sock_pid = None  # a socket is not shared with forked workers
+        self.next_connect = 0
+
+    def emit(self, event, **fields):
+        if self.disabled:
+            return
+
+        record = {
+            "v": EVENTS_VERSION,
+            "event": event,
+            "time": round(time.time(), 3),
+            "pid": os.getpid(),
+            **fields
+        }
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+
+        with self.lock:
+            if self.fd is not None:
+                self._write_fd(line)
+            else:
+                self._send(line)
+
+    def _write_fd(self, line):
+        # lines below PIPE_BUF are written at once, also by other processes
+        try:
+            view = memoryview(line)
+            while view:
+                view = view[os.write(self.fd, view):]
+        except OSError as ex:
+            logger.warning(f"Events disabled, can't write to fd {self.fd}: {ex}")
+            self.disabled = True
+
+    def _send(self, line):
+        if self.sock_pid != os.getpid():
+            self.sock = None
+
+        if self.sock is None:
+            if time.monotonic() < self.next_connect:
+                return
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(self.socket_path)
+                self.sock_pid = os.getpid()
+            except OSError:
+                self._drop_socket()
+                return
+
+        try:
+            self.sock.sendall(line)
+        except OSError:
+            self._drop_socket()
+
+    def _drop_socket(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.next_connect = time.monotonic() + RECONNECT_INTERVAL
+
+
+class ProgressReporter:
+    """
+    Emits the size and the bitrate of a recording at most once every
+    PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, user, file):
+        self.user = user
+        self.file = file
+        self.last_time = time.monotonic()
+        self.last_bytes = 0
+
+    def update(self, total_bytes):
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        if elapsed < PROGRESS_INTERVAL:
+            return
+
+        EventEmitter.shared().emit(
+            Event.RECORDING_PROGRESS,
+            user=self.user,
+            file=self.file,
+            bytes=total_bytes,
+            bitrate=round((total_bytes - self.last_bytes) * 8 / elapsed),
+        )
+        self.last_time = now
+        self.last_bytes = total_bytes
@@ -0,0 +1,236 @@
+import mmap
+import struct
+from collections import namedtuple
+
+
+# FLV file header (9 bytes) followed by the first PreviousTagSize (4 bytes)
+FLV_SIGNATURE = b'FLV'
+FLV_HEADER_SIZE = 13
+# type, data size, timestamp, timestamp extension, stream id
+FLV_TAG_HEADER_SIZE = 11
+PREVIOUS_TAG_SIZE = 4
+
+TAG_AUDIO = 8
+TAG_VIDEO = 9
+TAG_SCRIPT = 18
+TAG_TYPES = (TAG_AUDIO, TAG_VIDEO, TAG_SCRIPT)
+
+# tags bigger than this are treated as corruption
+MAX_TAG_SIZE = 16 * 1024 * 1024
+
+
+class Container:
+    FLV = 'flv'
+    MP4 = 'mp4'
+    UNKNOWN = 'unknown'
+
+
+FlvTag = namedtuple('FlvTag', 'type offset size timestamp keyframe')
+
+
+def sniff_container(path) -> str:
+    """
+    Detects the real container of a file from its first bytes.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(12)
+
+    if head.startswith(FLV_SIGNATURE):
+        return Container.FLV
+    if head[4:8] == b'ftyp':
+        return Container.MP4
+    return Container.UNKNOWN
+
+
+def parse_tag_header(data, offset):
+    """
+    Returns (type, data size, timestamp) of the tag at offset.
+    """
+    tag_type = data[offset] & 0x1F
+    size = int.from_bytes(data[offset + 1:offset + 4], 'big')
+    timestamp = int.from_bytes(data[offset + 4:offset + 7], 'big') | \
+        data[offset + 7] << 24
+    return tag_type, size, timestamp
+
+
+def is_keyframe(data, offset, tag_type) -> bool:
+    """
+    Whether the video tag at offset starts a keyframe, also for
+    enhanced FLV (HEVC/AV1) video tags.
+    """
+    if tag_type != TAG_VIDEO:
+        return False
+    first = data[offset + FLV_TAG_HEADER_SIZE]
+    return (first >> 4) & 0x07 == 1
+
+
+def is_sequence_header(tag_type, body) -> bool:
+    """
+    Whether the tag body starts with the codec configuration (AVC/HEVC
+    decoder record or AAC AudioSpecificConfig), needed before any frame.
+    """
+    if len(body) < 2:
+        return False
+
+    if tag_type == TAG_VIDEO:
+        if body[0] & 0x80:
+            # enhanced FLV, the packet type is in the low bits
+            return body[0] & 0x0F == 0
+        return body[0] & 0x0F in (7, 12) and body[1] == 0
+
+    if tag_type == TAG_AUDIO:
+        return body[0] >> 4 == 10 and body[1] == 0
+
+    return False
+
+
+class FlvScan:
+    """
+    Result of a full pass over an FLV file.
+    """
+
+    def __init__(self):
+        self.tags = 0
+        self.audio_tags = 0
+        self.video_tags = 0
+        self.keyframes = 0
+        self.duration_ms = 0
+        self.corrupt_bytes = 0  # skipped while resyncing
+        self.valid_end = FLV_HEADER_SIZE  # end of the last complete tag
+        self.size = 0
+
+    @property
+    def has_media(self) -> bool:
+        return bool(self.audio_tags or self.video_tags)
+
+    @property
+    def truncated(self) -> bool:
+        return self.valid_end < self.size
+
+
+class FlvReader:
+    """
+    Walks the tags of an FLV file through a memory map, without reading
+    the media data.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _tag_fits(self, data, offset) -> bool:
+        """
+        Whether a complete and plausible tag starts at offset.
+        """
+        end = len(data)
+        if offset + FLV_TAG_HEADER_SIZE > end:
+            return False
+
+        tag_type, size, _ = parse_tag_header(data, offset)
+        if tag_type not in TAG_TYPES or size > MAX_TAG_SIZE:
+            return False
+
+        # stream id is always 0
+        if data[offset + 8:offset + 11] != b'\x00\x00\x00':
+            return False
+
+        tail = offset + FLV_TAG_HEADER_SIZE + size
+        if tail + PREVIOUS_TAG_SIZE > end:
+            return False
+
+        previous_size, = struct.unpack_from('>I', data, tail)
+        return previous_size == FLV_TAG_HEADER_SIZE + size
+
+    def _resync(self, data, offset):
+        """
+        Returns the offset of the next plausible tag after corruption,
+        or None at the end of the data.
+        """
+        end = len(data)
+        offset += 1
+        while offset < end:
+            candidates = [
+                pos for pos in (
+                    data.find(bytes([t]), offset) for t in TAG_TYPES)
+                if pos != -1
+            ]
+            if not candidates:
+                return None
+            offset = min(candidates)
+            if self._tag_fits(data, offset):
+                return offset
+            offset += 1
+        return None
+
+    def ends_cleanly(self) -> bool:
+        """
+        Whether the file ends with a complete tag, found from the last
+        PreviousTagSize without walking the file. False for a file with
+        no tag at all.
+        """
+        with open(self.path, 'rb') as f:
+            size = f.seek(0, 2)
+            if size < FLV_HEADER_SIZE + PREVIOUS_TAG_SIZE:
+                return False
+
+            f.seek(size - PREVIOUS_TAG_SIZE)
+            previous_size, = struct.unpack('>I', f.read(PREVIOUS_TAG_SIZE))
+            offset = size - PREVIOUS_TAG_SIZE - previous_size
+            if previous_size < FLV_TAG_HEADER_SIZE or \
+                    previous_size > FLV_TAG_HEADER_SIZE + MAX_TAG_SIZE or \
+                    offset < FLV_HEADER_SIZE:
+                return False
+
+            f.seek(offset)
+            return self._tag_fits(f.read(), 0)
+
+    def tags(self):
+        """
+        Yields every tag of the file, skipping corrupted ranges.
+        """
+        scan = FlvScan()
+        yield from self._walk(scan)
+
+    def scan(self) -> FlvScan:
+        scan = FlvScan()
+        for _ in self._walk(scan):
+            pass
+        return scan
+
+    def _walk(self, scan):
+        with open(self.path, 'rb') as f:
+            scan.size = f.seek(0, 2)
+            if scan.size < FLV_HEADER_SIZE:
+                scan.valid_end = 0
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:3] != FLV_SIGNATURE:
+                    scan.valid_end = 0
+                    return
+
+                offset = FLV_HEADER_SIZE
+                while offset < scan.size:
+                    if not self._tag_fits(data, offset):
+                        next_offset = self._resync(data, offset)
+                        if next_offset is None:
+                            # a partial tag at the end of the file
+                            return
+                        scan.corrupt_bytes += next_offset - offset
+                        offset = next_offset
+
+                    tag_type, size, timestamp = \
+                        parse_tag_header(data, offset)
+                    keyframe = is_keyframe(data, offset, tag_type)
+
+                    scan.tags += 1
+                    if tag_type == TAG_AUDIO:
+                        scan.audio_tags += 1
+                    elif tag_type == TAG_VIDEO:
+                        scan.video_tags += 1
+                        scan.keyframes += keyframe
+                    scan.duration_ms = max(scan.duration_ms, timestamp)
+
+                    yield FlvTag(tag_type, offset, size, timestamp, keyframe)
+
+                    offset += FLV_TAG_HEADER_SIZE + size + PREVIOUS_TAG_SIZE
+                    scan.valid_end = offset
@@ -0,0 +1,137 @@
+import threading
+import time
+
+from utils.enums import TimeOut
+from utils.logger_manager import logger
+from utils.storage import open_database
+
+
+# max number of usernames kept, least recently used ones are evicted
+ROOM_CACHE_MAX_ENTRIES = 5000
+# cache hits kept in memory before their last_used is written
+TOUCH_BATCH = 100
+
+
+class RoomIdCache:
+    """
+    Persistent username -> room_id cache.
+
+    A room_id only changes when a new live starts, so it is kept until
+    its TTL expires or check_alive reports the room as dead.
+    """
+
+    _instance = None  # Singleton instance
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        path=None,
+        ttl=TimeOut.ROOM_ID_CACHE * TimeOut.ONE_MINUTE,
+        max_entries=ROOM_CACHE_MAX_ENTRIES
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.touched = {}  # username -> last use not yet written
+
+        self.conn = open_database(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS room_cache ("
+            "username TEXT PRIMARY KEY, "
+            "room_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS room_cache_room_id "
+            "ON room_cache (room_id)"
+        )
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns the process-wide cache, or None if it can't be opened.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                try:
+                    cls._instance = cls()
+                except Exception as ex:
+                    logger.error(f"Room ID cache disabled: {ex}")
+                    cls._instance = False
+            return cls._instance or None
+
+    def get(self, username):
+        """
+        Returns the cached room_id of the user, or None.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT room_id, created_at FROM room_cache "
+                "WHERE username = ?", (username,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            room_id, created_at = row
+            if now - created_at > self.ttl:
+                self.conn.execute(
+                    "DELETE FROM room_cache WHERE username = ?", (username,))
+                return None
+
+            # the order only matters to the next eviction, hits don't
+            # write to the disk one by one
+            self.touched[username] = now
+            if len(self.touched) >= TOUCH_BATCH:
+                self._write_touches()
+            return room_id
+
+    def set(self, username, room_id):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO room_cache "
+                "(username, room_id, created_at, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (username, str(room_id), now, now)
+            )
+            self.touched.pop(username, None)
+            self._write_touches()
+            self._evict()
+
+    def invalidate_rooms(self, room_ids):
+        """
+        Drops every user whose cached room is among the given ones.
+        """
+        room_ids = [str(r) for r in room_ids]
+        if not room_ids:
+            return
+
+        with self.lock:
+            # keep well below SQLite's bound parameters limit
+            for i in range(0, len(room_ids), 500):
+                chunk = room_ids[i:i + 500]
+                self.conn.execute(
+                    "DELETE FROM room_cache WHERE room_id IN "
+                    f"({','.join('?' * len(chunk))})", chunk
+                )
+
+    def _write_touches(self):
+        if not self.touched:
+            return
+
+        self.conn.executemany(
+            "UPDATE room_cache SET last_used = ? WHERE username = ?",
+            [(used, user) for user, used in self.touched.items()]
+        )
+        self.touched.clear()
+
+    def _evict(self):
+        self.conn.execute(
+            "DELETE FROM room_cache WHERE username IN ("
+            "SELECT username FROM room_cache "
+            "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
@@ -0,0 +1,251 @@
+from utils.flv import FLV_HEADER_SIZE, FLV_SIGNATURE, FLV_TAG_HEADER_SIZE, \
+    PREVIOUS_TAG_SIZE, TAG_AUDIO, TAG_SCRIPT, TAG_TYPES, TAG_VIDEO, \
+    MAX_TAG_SIZE, is_keyframe, is_sequence_header, parse_tag_header
+from utils.logger_manager import logger
+from utils.stream_writer import StreamWriter, create_stream_writer
+
+
+def set_timestamp(header, timestamp) -> None:
+    header[4:7] = (timestamp & 0xFFFFFF).to_bytes(3, 'big')
+    header[7] = (timestamp >> 24) & 0xFF
+
+
+class SegmentWriter:
+    """
+    Writes a live FLV stream as a series of files of bounded size or
+    duration, with the same interface as StreamWriter.
+
+    Cuts are made right before a video keyframe (before any audio tag for
+    audio only lives). Every segment starts with the FLV header, the
+    metadata and the codec sequence headers of the stream and has its
+    timestamps starting at zero, so each one can be converted on its own
+    as soon as it is closed.
+    """
+
+    max_size = 0  # bytes, 0 for no limit
+    max_duration = 0  # seconds, 0 for no limit
+
+    @classmethod
+    def configure(cls, max_size=0, max_duration=0):
+        cls.max_size = max_size
+        cls.max_duration = max_duration
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(cls.max_size or cls.max_duration)
+
+    def __init__(self, make_path, on_segment):
+        self.make_path = make_path  # segment number -> file path
+        self.on_segment = on_segment  # called with every closed segment
+
+        self.chunk = bytearray(StreamWriter.chunk_size)
+        self.chunk_view = memoryview(self.chunk)
+        self.bytes_received = 0
+
+        # replayed at the start of every segment
+        self.file_header = None
+        self.script_tag = None
+        self.sequence_headers = {}  # tag type -> tag
+
+        # parser state, tags can span reads
+        self.head = bytearray()
+        self.head_size = FLV_HEADER_SIZE
+        self.remaining = 0  # bytes of the current tag still to read
+        # the current tag, written once complete so that a connection
+        # dropped in the middle of it leaves nothing behind
+        self.tag = bytearray()
+        self.replayed = False  # the current tag starts every segment
+        self.passthrough = False  # not a valid FLV stream, no cuts
+        self.has_video = False
+
+        # output timestamps are relative to the start of the segment
+        self.timestamp_base = None
+        self.next_timestamp = 0
+        self.last_timestamp = 0
+
+        self.index = 0
+        self.path = None
+        self.file = None
+        self.writer = None
+        self.segment_bytes = 0
+
+        # backpressure metrics of all the segments
+        self.max_queue_depth = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+
+    def read_from(self, raw) -> int:
+        size = raw.readinto(self.chunk_view)
+        if not size:
+            return 0
+
+        self.bytes_received += size
+        self._feed(self.chunk_view[:size])
+        return size
+
+    def write(self, data) -> None:
+        view = memoryview(data)
+        self.bytes_received += len(view)
+        self._feed(view)
+
+    def new_stream(self) -> None:
+        """
+        The data of a new connection follows, without its FLV header.
+        A tag cut by the disconnection is dropped and timestamps carry on
+        from the last one written.
+        """
+        self.remaining = 0
+        self.tag = bytearray()
+        self.replayed = False
+        self.head.clear()
+        self.head_size = FLV_TAG_HEADER_SIZE
+        self.timestamp_base = None
+        self.next_timestamp = self.last_timestamp
+
+    def flush(self) -> None:
+        if self.writer:
+            self.writer.flush()
+
+    def close(self) -> None:
+        self._close_segment()
+        self.chunk_view.release()
+
+    def _feed(self, view) -> None:
+        while view:
+            if self.passthrough:
+                self._emit(view)
+                return
+
+            if self.remaining:
+                size = min(self.remaining, len(view))
+                self.tag += view[:size]
+                self.remaining -= size
+                view = view[size:]
+                if not self.remaining:
+                    self._tag_complete()
+                continue
+
+            size = min(self.head_size - len(self.head), len(view))
+            self.head += view[:size]
+            view = view[size:]
+            if len(self.head) == self.head_size:
+                self._parse_head()
+
+    def _parse_head(self) -> None:
+        if self.file_header is None:
+            if not self.head.startswith(FLV_SIGNATURE):
+                self._stop_segmenting()
+                return
+
+            self.file_header = bytes(self.head)
+            self.head.clear()
+            self.head_size = FLV_TAG_HEADER_SIZE
+            if self.writer is None:
+                self._open_segment()
+            return
+
+        tag_type, size, timestamp = parse_tag_header(self.head, 0)
+        if tag_type not in TAG_TYPES or size > MAX_TAG_SIZE:
+            self._stop_segmenting()
+            return
+
+        # read the first body bytes before deciding on a cut
+        probe_size = FLV_TAG_HEADER_SIZE + min(size, 2)
+        if len(self.head) < probe_size:
+            self.head_size = probe_size
+            return
+
+        body = self.head[FLV_TAG_HEADER_SIZE:]
+        sequence_header = is_sequence_header(tag_type, body)
+        if tag_type == TAG_VIDEO:
+            self.has_video = True
+
+        cut_point = not sequence_header and (
+            (tag_type == TAG_VIDEO and is_keyframe(self.head, 0, tag_type)) or
+            (tag_type == TAG_AUDIO and not self.has_video)
+        )
+        if cut_point and self._segment_full():
+            self._close_segment()
+            self.timestamp_base = None
+            self.next_timestamp = 0
+
+        # metadata and sequence headers don't carry a media timestamp
+        replayed = tag_type == TAG_SCRIPT or sequence_header
+        if self.timestamp_base is None and not replayed:
+            self.timestamp_base = timestamp - self.next_timestamp
+
+        if self.timestamp_base is None:
+            self.last_timestamp = self.next_timestamp
+        else:
+            self.last_timestamp = max(0, timestamp - self.timestamp_base)
+        set_timestamp(self.head, self.last_timestamp)
+
+        self.replayed = replayed
+        self.tag = self.head
+        self.remaining = size - len(body) + PREVIOUS_TAG_SIZE
+        self.head = bytearray()
+        self.head_size = FLV_TAG_HEADER_SIZE
+
+    def _tag_complete(self) -> None:
+        tag, self.tag = self.tag, bytearray()
+        self._emit(tag)
+
+        if not self.replayed:
+            return
+
+        self.replayed = False
+        tag = bytearray(tag)
+        set_timestamp(tag, 0)
+        if tag[0] & 0x1F == TAG_SCRIPT:
+            self.script_tag = bytes(tag)
+        else:
+            self.sequence_headers[tag[0] & 0x1F] = bytes(tag)
+
+    def _stop_segmenting(self) -> None:
+        logger.warning("Unexpected data in the stream, segmenting stopped")
+        self.passthrough = True
+        head, self.head = self.head, bytearray()
+        self._emit(head)
+
+    def _segment_full(self) -> bool:
+        if self.writer is None:
+            return False
+        if self.max_size and self.segment_bytes >= self.max_size:
+            return True
+        return bool(self.max_duration and
+                    self.last_timestamp >= self.max_duration * 1000)
+
+    def _emit(self, data) -> None:
+        if self.writer is None:
+            self._open_segment()
+        self.writer.write(data)
+        self.segment_bytes += len(data)
+
+    def _open_segment(self) -> None:
+        self.index += 1
+        self.path = self.make_path(self.index)
+        self.file = open(self.path, "wb", buffering=0)
+        self.writer = create_stream_writer(self.file.fileno())
+        self.segment_bytes = 0
+
+        replay = [self.file_header, self.script_tag,
+                  *self.sequence_headers.values()]
+        for data in replay:
+            if data:
+                self.writer.write(data)
+                self.segment_bytes += len(data)
+
+    def _close_segment(self) -> None:
+        if self.writer is None:
+            return
+
+        writer, self.writer = self.writer, None
+        try:
+            writer.close()
+        finally:
+            self.file.close()
+            self.max_queue_depth = max(
+                self.max_queue_depth, writer.max_queue_depth)
+            self.stalls += writer.stalls
+            self.stall_seconds += writer.stall_seconds
+            self.on_segment(self.path)
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+
+
+DATABASE_NAME = "recorder.db"
+
+
+def get_database_path() -> str:
+    """
+    Returns the path of the local database, next to the config files.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, "..", DATABASE_NAME)
+
+
+def open_database(path=None) -> sqlite3.Connection:
+    """
+    Opens the local SQLite database shared by the recorder caches.
+    The connection can be used from several threads, callers must
+    serialize access with their own lock.
+    """
+    conn = sqlite3.connect(
+        path or get_database_path(),
+        timeout=30,
+        check_same_thread=False,
+        isolation_level=None,  # autocommit
+    )
+    # WAL lets worker processes read while another one writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def add_column(conn, table, column, declaration) -> None:
+    """
+    Adds a column to a table created by an older version, if missing.
+    """
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
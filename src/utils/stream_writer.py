@@ -0,0 +1,221 @@
+import os
+import queue
+import threading
+import time
+
+from utils.custom_exceptions import RecordingWriteError
+
+
+KB = 1024
+MB = 1024 * KB
+
+
+def write_all(fd, view) -> None:
+    """
+    Writes the whole buffer to the file descriptor, retrying short writes.
+    """
+    try:
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    except OSError as ex:
+        # kept apart from ConnectionError, which means a network problem
+        raise RecordingWriteError(f"Failed to write the recording: {ex}")
+
+
+class StreamWriter:
+    """
+    Copies a live stream to a file descriptor through a single
+    preallocated buffer.
+
+    The network response reads straight into the buffer and the buffer is
+    handed to os.write once `flush_size` bytes are collected, so no
+    intermediate bytes objects are built per chunk.
+    """
+
+    chunk_size = 64 * KB
+    flush_size = 1024 * KB
+
+    # backpressure metrics, a synchronous writer never queues
+    max_queue_depth = 0
+    stalls = 0
+    stall_seconds = 0.0
+
+    @classmethod
+    def configure(cls, chunk_size=None, flush_size=None):
+        """
+        Sets the process-wide default sizes, in bytes.
+        """
+        if chunk_size:
+            cls.chunk_size = chunk_size
+        if flush_size:
+            cls.flush_size = flush_size
+
+    def __init__(self, fd, chunk_size=None, flush_size=None):
+        self.fd = fd
+        self.chunk_size = chunk_size or self.chunk_size
+        self.flush_size = max(flush_size or self.flush_size, self.chunk_size)
+
+        self.buffer = bytearray(self.flush_size)
+        self.view = memoryview(self.buffer)
+        self.pos = 0
+        self.bytes_received = 0  # counted by the reader
+        self.bytes_written = 0  # counted once on disk
+
+    def read_from(self, raw) -> int:
+        """
+        Reads the next chunk from a binary file-like object.
+        Returns the number of bytes read, 0 at the end of the stream.
+        """
+        size = raw.readinto(self.view[self.pos:self.pos + self.chunk_size])
+        if not size:
+            return 0
+
+        self.bytes_received += size
+        self.pos += size
+        if self.pos >= self.flush_size:
+            self.flush()
+
+        return size
+
+    def write(self, data) -> None:
+        """
+        Copies bytes into the buffer, for the few bytes that don't come
+        straight from the stream.
+        """
+        view = memoryview(data)
+        self.bytes_received += len(view)
+        while view:
+            size = min(len(view), self.flush_size - self.pos)
+            self.view[self.pos:self.pos + size] = view[:size]
+            self.pos += size
+            view = view[size:]
+            if self.pos >= self.flush_size:
+                self.flush()
+
+    def new_stream(self) -> None:
+        """
+        The data of a new connection follows. The bytes are copied as
+        they come, nothing to reset.
+        """
+
+    def flush(self) -> None:
+        if not self.pos:
+            return
+
+        size, self.pos = self.pos, 0
+        write_all(self.fd, self.view[:size])
+        self.bytes_written += size
+
+    def close(self) -> None:
+        self.flush()
+        self.view.release()
+
+
+class ThreadedStreamWriter(StreamWriter):
+    """
+    StreamWriter that hands full buffers to a dedicated disk thread.
+
+    The network reader never waits on the disk unless `high_water_mark`
+    buffers are already queued; only then it blocks (backpressure), and
+    the stall is counted.
+    """
+
+    high_water_mark = 4
+
+    @classmethod
+    def configure(cls, chunk_size=None, flush_size=None,
+                  high_water_mark=None):
+        StreamWriter.configure(chunk_size, flush_size)
+        if high_water_mark is not None:
+            cls.high_water_mark = high_water_mark
+
+    def __init__(self, fd, chunk_size=None, flush_size=None,
+                 high_water_mark=None):
+        super().__init__(fd, chunk_size, flush_size)
+        self.high_water_mark = high_water_mark or self.high_water_mark
+
+        # buffers ready to be filled, the one in use is not counted
+        self.free = queue.Queue()
+        for _ in range(self.high_water_mark):
+            self.free.put(bytearray(self.flush_size))
+        self.pending = queue.Queue()  # (buffer, size) waiting for the disk
+        self.error = None
+        self._error_raised = False
+
+        # backpressure metrics
+        self.max_queue_depth = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+
+        self.thread = threading.Thread(
+            target=self._drain, name="disk-writer", daemon=True)
+        self.thread.start()
+
+    def flush(self) -> None:
+        self._raise_error()
+
+        if not self.pos:
+            return
+
+        self.pending.put((self.buffer, self.pos))
+        self.max_queue_depth = max(
+            self.max_queue_depth, self.pending.qsize())
+
+        try:
+            buffer = self.free.get_nowait()
+        except queue.Empty:
+            self.stalls += 1
+            started = time.monotonic()
+            buffer = self.free.get()
+            self.stall_seconds += time.monotonic() - started
+
+        self.view.release()
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.pos = 0
+
+    def _drain(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+
+            buffer, size = item
+            try:
+                # after an error keep recycling buffers so the reader
+                # doesn't block, it raises on its next flush
+                if self.error is None:
+                    with memoryview(buffer) as view:
+                        write_all(self.fd, view[:size])
+                    self.bytes_written += size
+            except RecordingWriteError as ex:
+                self.error = ex
+            finally:
+                self.free.put(buffer)
+
+    def _raise_error(self):
+        # the reader is told once, later buffers are silently dropped
+        if self.error and not self._error_raised:
+            self._error_raised = True
+            raise self.error
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self.pending.put(None)
+            self.thread.join()
+            self.view.release()
+
+        self._raise_error()
+
+
+def create_stream_writer(fd) -> StreamWriter:
+    """
+    Returns the writer configured for this process: threaded unless the
+    write queue is disabled.
+    """
+    if ThreadedStreamWriter.high_water_mark:
+        return ThreadedStreamWriter(fd)
+    return StreamWriter(fd)
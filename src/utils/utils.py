@@ -60,3 +60,108 @@ def is_linux() -> bool:
     """
     import platform
     return platform.system().lower() == "linux"
+
+
+def process_start_time(pid):
+    """
+    Tells when a process was started, to tell it apart from a later one
+    given the same pid.
+
+    Returns:
+        str: An opaque start time, empty if the platform doesn't tell,
+        or None if no process has this pid.
+    """
+    if is_windows():
+        return _windows_process_start_time(pid)
+
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # the name may hold spaces, fields are counted after it
+            return f.read().rsplit(')', 1)[1].split()[19]
+    except FileNotFoundError:
+        return None
+    except (OSError, IndexError):
+        pass  # no procfs, e.g. on macOS
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except OSError:
+        pass  # exists but belongs to someone else
+    return ''
+
+
+def _windows_process_start_time(pid):
+    # os.kill would terminate the process on Windows
+    import ctypes
+    from ctypes import wintypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    STILL_ACTIVE = 259
+
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # denied means the process exists but belongs to someone else
+        return '' if ctypes.GetLastError() == 5 else None
+
+    try:
+        exit_code = wintypes.DWORD()
+        if kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)) and \
+                exit_code.value != STILL_ACTIVE:
+            return None
+
+        created, exited, kernel, user = (wintypes.FILETIME() for _ in range(4))
+        if not kernel32.GetProcessTimes(
+                handle, ctypes.byref(created), ctypes.byref(exited),
+                ctypes.byref(kernel), ctypes.byref(user)):
+            return ''
+        return str(created.dwHighDateTime << 32 | created.dwLowDateTime)
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+_owner_tokens = {}  # pid -> token, forked workers get their own
+
+
+def owner_token() -> str:
+    """
+    Identifies this run of the recorder in the rows it owns: the pid,
+    the process start time and a random part, so a restart given the
+    same pid, as in a container, is a different owner.
+    """
+    pid = os.getpid()
+    if pid not in _owner_tokens:
+        import uuid
+        _owner_tokens[pid] = \
+            f"{pid}:{process_start_time(pid) or ''}:{uuid.uuid4().hex}"
+    return _owner_tokens[pid]
+
+
+def is_owner_running(token) -> bool:
+    """
+    Checks if the run that wrote this owner token is still going.
+
+    Returns:
+        bool: True if it runs or can't be checked.
+    """
+    if token == owner_token():
+        return True
+
+    try:
+        pid, started, _ = token.split(':')
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False  # written before owner tokens
+
+    # this process can't be two runs, the token is from an earlier one
+    if pid == os.getpid():
+        return False
+
+    current = process_start_time(pid)
+    if current is None:
+        return False
+    if started and current:
+        return started == current
+    return True
@@ -1,10 +1,80 @@
 import os
+import glob
+import math
 import time
 import shutil
+import subprocess
 
-import ffmpeg
-
+from utils.flv import Container, FlvReader, sniff_container
 from utils.logger_manager import logger
+from utils.metrics import MetricsRegistry
+
+
+CONVERSION_SECONDS = MetricsRegistry.shared().histogram(
+    'conversion_seconds', 'Duration of the conversions of the recordings')
+
+
+class LiveRemuxer:
+    """
+    Pipes a live FLV stream into a long-lived ffmpeg process that writes
+    a fragmented MP4, playable while recording and final once the live
+    ends, with no conversion pass afterwards.
+
+    The input is read as live_flv: the timestamps of a stream restart
+    from zero after a reconnection, and ffmpeg carries them on instead
+    of writing fragments that go back in time.
+    """
+
+    def __init__(self, output_file):
+        import ffmpeg  # imported on use, costly at startup
+        self.output_file = output_file
+
+        args = (
+            ffmpeg
+            .input('pipe:0', f='live_flv')
+            .output(
+                output_file,
+                c='copy',
+                f='mp4',
+                movflags='frag_keyframe+empty_moov+default_base_moof',
+            )
+            .overwrite_output()
+            .compile()
+        )
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def fileno(self) -> int:
+        return self.process.stdin.fileno()
+
+    def close(self, timeout=60) -> bool:
+        """
+        Ends the input and waits for ffmpeg to finalize the file.
+        """
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass  # ffmpeg already gone
+
+        try:
+            return_code = self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            return_code = self.process.wait()
+
+        if return_code != 0:
+            logger.error(f"FFmpeg live remux exited with code {return_code}")
+        return return_code == 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
 
 class VideoManagement:
@@ -24,10 +94,42 @@ class VideoManagement:
         return False
 
     @staticmethod
+    def split_video(file, max_size):
+        """
+        Splits an MP4 video into numbered parts smaller than max_size with
+        a stream copy, cutting on keyframes. Returns the paths of the parts.
+        """
+        import ffmpeg
+        size = os.path.getsize(file)
+        duration = float(ffmpeg.probe(file)['format']['duration'])
+
+        # parts are cut on keyframes, so they are not even: leave a margin
+        count = math.ceil(size / (max_size * 0.9))
+        stem = file[:-len('.mp4')] if file.endswith('.mp4') else file
+
+        ffmpeg.input(file).output(
+            f"{stem}_split%03d.mp4",
+            c='copy',
+            map=0,
+            f='segment',
+            segment_time=duration / count,
+            segment_start_number=1,
+            reset_timestamps=1,
+        ).run(quiet=True, overwrite_output=True)
+
+        return sorted(glob.glob(f"{glob.escape(stem)}_split[0-9][0-9][0-9].mp4"))
+
+    @staticmethod
+    @CONVERSION_SECONDS.time()
     def convert_flv_to_mp4(file):
         """
         Convert the video from flv format to mp4 format.
         Only converts if the file is actually FLV format.
+
+        The container is sniffed from the file header: MP4 recordings are
+        only renamed. FLV recordings whose last tag is cut are scanned and
+        truncated to their last complete tag before the ffmpeg stream
+        copy, and are never renamed to .mp4 when ffmpeg fails.
         """
         # Check if file actually needs conversion
         if not file.endswith('_flv.mp4'):
@@ -47,6 +149,27 @@ class VideoManagement:
             os.remove(file)  # Remove the source file
             return
 
+        container = sniff_container(file)
+        if container == Container.MP4:
+            shutil.move(file, output_file)
+            logger.info("File already in MP4 format, skipping conversion")
+            return
+
+        if container == Container.FLV and not FlvReader(file).ends_cleanly():
+            # only an interrupted recording needs the full pass
+            scan = FlvReader(file).scan()
+            if not scan.has_media:
+                logger.error("Recording has no audio or video, nothing to convert")
+                return
+
+            if scan.truncated:
+                # an interrupted write leaves half a tag at the end
+                logger.warning(
+                    f"Dropping {scan.size - scan.valid_end} bytes of "
+                    f"incomplete data at the end of the recording")
+                os.truncate(file, scan.valid_end)
+
+        import ffmpeg
         try:
             # First, try the standard copy method (fastest)
             try:
@@ -57,46 +180,46 @@ class VideoManagement:
                 ).run(quiet=True, overwrite_output=True)
                 
             except ffmpeg.Error as e:
-                # If copy fails due to codec issues, just rename the file
-                # Many "FLV" files from TikTok are actually MP4 containers
-                logger.warning("Direct copy failed, trying simple rename...")
-                
-                try:
-                    # Just rename the file - many _flv.mp4 files are actually valid MP4s
-                    shutil.move(file, output_file)
-                    logger.info("Successfully renamed file (was already MP4 format)")
-                    return
-                    
-                except Exception as rename_error:
-                    logger.error(f"Rename failed: {rename_error}")
-                    
-                    # Last resort: try basic re-encoding
-                    logger.warning("Trying basic re-encoding...")
+                # Many "FLV" files from TikTok are actually MP4 containers,
+                # a real FLV file must not be renamed to .mp4
+                if container != Container.FLV:
+                    logger.warning("Direct copy failed, trying simple rename...")
                     try:
-                        ffmpeg.input(file).output(
-                            output_file,
-                            vcodec='libx264',
-                            acodec='aac',
-                            preset='ultrafast',
-                            y='-y',
-                        ).run(quiet=True, overwrite_output=True)
-                        
-                    except ffmpeg.Error as e2:
-                        error_msg = e2.stderr.decode() if hasattr(e2, 'stderr') and e2.stderr else str(e2)
-                        if "not implemented" in error_msg.lower():
-                            # If conversion fails due to codec, just rename and hope for the best
-                            logger.warning("FFmpeg codec not supported, keeping original file as MP4...")
-                            try:
-                                shutil.copy2(file, output_file)
-                                os.remove(file)
-                                logger.info("Copied original file as MP4 (may need manual conversion)")
-                                return
-                            except Exception:
-                                logger.error("Could not even copy the file")
-                                return
-                        else:
-                            raise e2
-            
+                        shutil.move(file, output_file)
+                        logger.info("Successfully renamed file (was already MP4 format)")
+                        return
+
+                    except Exception as rename_error:
+                        logger.error(f"Rename failed: {rename_error}")
+
+                # Last resort: try basic re-encoding
+                logger.warning("Trying basic re-encoding...")
+                try:
+                    ffmpeg.input(file).output(
+                        output_file,
+                        vcodec='libx264',
+                        acodec='aac',
+                        preset='ultrafast',
+                        y='-y',
+                    ).run(quiet=True, overwrite_output=True)
+
+                except ffmpeg.Error as e2:
+                    error_msg = e2.stderr.decode() if hasattr(e2, 'stderr') and e2.stderr else str(e2)
+                    if "not implemented" in error_msg.lower() and \
+                            container != Container.FLV:
+                        # If conversion fails due to codec, just rename and hope for the best
+                        logger.warning("FFmpeg codec not supported, keeping original file as MP4...")
+                        try:
+                            shutil.copy2(file, output_file)
+                            os.remove(file)
+                            logger.info("Copied original file as MP4 (may need manual conversion)")
+                            return
+                        except Exception:
+                            logger.error("Could not even copy the file")
+                            return
+                    else:
+                        raise e2
+
             # Verify conversion success
             if os.path.exists(output_file):
                 output_size = os.path.getsize(output_file)